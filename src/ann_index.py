@@ -0,0 +1,123 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+# Index backends for product retrieval. "flat" is exact search; the others trade a
+# little recall for sub-linear search cost on large catalogs:
+#   ivf_flat - inverted lists over k-means cells, full vectors inside each cell
+#   ivf_pq   - inverted lists with product-quantized codes (much smaller in memory)
+#   hnsw     - graph based, no training needed
+# Build parameters are part of the artifact key; search parameters (nprobe, efSearch)
+# can be changed per deployment without rebuilding. Embeddings are L2-normalized, so
+# every backend uses inner product (= cosine similarity) by default.
+
+INDEX_KINDS = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def config_from_env():
+    return {
+        "kind": os.getenv("INDEX_KIND", "flat"),
+        "nlist": int(os.getenv("INDEX_NLIST", "0")),  # 0 = pick from catalog size
+        "pq_m": int(os.getenv("INDEX_PQ_M", "48")),
+        "pq_bits": int(os.getenv("INDEX_PQ_BITS", "8")),
+        "hnsw_m": int(os.getenv("INDEX_HNSW_M", "32")),
+        "ef_construction": int(os.getenv("INDEX_EF_CONSTRUCTION", "200")),
+        "train_size": int(os.getenv("INDEX_TRAIN_SIZE", "100000")),
+        "nprobe": int(os.getenv("INDEX_NPROBE", "16")),
+        "ef_search": int(os.getenv("INDEX_EF_SEARCH", "64")),
+    }
+
+
+def describe(config):
+    # Only the parameters that change what gets built; used in the artifact key
+    kind = config["kind"]
+    if kind == "flat":
+        return "flat"
+    if kind == "ivf_flat":
+        return f"ivf_flat-nlist{config['nlist']}"
+    if kind == "ivf_pq":
+        return f"ivf_pq-nlist{config['nlist']}-m{config['pq_m']}x{config['pq_bits']}"
+    if kind == "hnsw":
+        return f"hnsw-m{config['hnsw_m']}-efc{config['ef_construction']}"
+    raise ValueError(f"Unknown index kind '{kind}', expected one of {INDEX_KINDS}")
+
+
+def default_nlist(num_rows):
+    # Usual rule of thumb: ~4*sqrt(N) cells, with enough points per cell to train
+    return max(1, min(int(4 * math.sqrt(num_rows)), num_rows // 39))
+
+
+def train_sample(embeddings, size, seed=0):
+    if len(embeddings) <= size:
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    rows = np.random.default_rng(seed).choice(len(embeddings), size, replace=False)
+    rows.sort()
+    return np.ascontiguousarray(embeddings[rows], dtype=np.float32)
+
+
+def create_index(dim, config, num_rows, metric=faiss.METRIC_INNER_PRODUCT):
+    kind = config["kind"]
+    if kind == "flat":
+        return faiss.IndexFlat(dim, metric)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config["hnsw_m"], metric)
+        index.hnsw.efConstruction = config["ef_construction"]
+        return index
+
+    nlist = config["nlist"] or default_nlist(num_rows)
+    quantizer = faiss.IndexFlat(dim, metric)
+    if kind == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+    if kind == "ivf_pq":
+        if dim % config["pq_m"]:
+            raise ValueError(f"INDEX_PQ_M={config['pq_m']} must divide the embedding dimension {dim}")
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, config["pq_m"], config["pq_bits"], metric)
+    raise ValueError(f"Unknown index kind '{kind}', expected one of {INDEX_KINDS}")
+
+
+def build_index(embeddings, config, metric=faiss.METRIC_INNER_PRODUCT, chunk_rows=65536):
+    # embeddings may be a (float16) memmap; it is added in float32 chunks, never copied whole
+    index = create_index(embeddings.shape[1], config, len(embeddings), metric)
+    if not index.is_trained:
+        index.train(train_sample(embeddings, config["train_size"]))
+    for start in range(0, len(embeddings), chunk_rows):
+        index.add(np.ascontiguousarray(embeddings[start:start + chunk_rows], dtype=np.float32))
+    set_search_params(index, config["nprobe"], config["ef_search"])
+    return index
+
+
+def _unwrap(index):
+    # Look through IndexIDMap wrappers to the index that holds the search parameters
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW) and ef_search:
+        inner.hnsw.efSearch = ef_search
+    return index
+
+
+def search_parameters(index, selector):
+    # Per-call parameters that restrict a search to the ids accepted by selector,
+    # carrying over the nprobe / efSearch already configured on the index
+    ivf = faiss.try_extract_index_ivf(index)
+    inner = _unwrap(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = ivf.nprobe
+    elif isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = inner.hnsw.efSearch
+    else:
+        params = faiss.SearchParameters()
+    params.sel = selector
+    return params
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no flock, so every process acts as the writer (run a single worker)
+    fcntl = None
+
+import faiss
+import numpy as np
+
+from attributes import AttributeTable, AttributeWriter
+from catalog_store import CatalogStore, TextColumnWriter, write_ids
+from lexical_index import LexicalIndex, LexicalIndexWriter
+
+# On-disk store for everything the retriever needs at startup:
+#   index.faiss     - serialized FAISS index
+#   manifest.json   - what the artifacts were built from
+#   the catalog columns read by catalog_store.CatalogStore: ids, names, texts and the
+#   L2-normalized embedding matrix (float32, or float16 with EMBEDDING_DTYPE=float16)
+#   the BM25 postings read by lexical_index.LexicalIndex
+#   the attribute columns (colour, size, price, category) read by attributes.AttributeTable
+# Each build lives in its own directory keyed by a hash of the dataset file, the
+# embedding model, the index build spec and the embedding dtype, so a changed catalog,
+# model or index type never reuses stale files.
+
+# Bump whenever the layout, the way embeddings are produced or the attribute parsing
+# (attributes.py) changes
+FORMAT_VERSION = 6
+
+ARTIFACT_ROOT = os.getenv("ARTIFACT_DIR", "../artifacts")
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(dataset_digest, model_name, index_spec="flat", embedding_dtype=EMBEDDING_DTYPE):
+    h = hashlib.sha256()
+    h.update(f"v{FORMAT_VERSION}\n{model_name}\n{index_spec}\n{embedding_dtype}\n{dataset_digest}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def artifact_dir(key, root=ARTIFACT_ROOT):
+    return os.path.join(root, f"v{FORMAT_VERSION}", key)
+
+
+def exists(key, root=ARTIFACT_ROOT):
+    return os.path.exists(os.path.join(artifact_dir(key, root), MANIFEST_FILE))
+
+
+class ArtifactBuilder:
+    # Streams a build into a scratch directory and renames it into place on commit,
+    # so a crashed build or a concurrent replica never sees a half-written store.
+    #   with ArtifactBuilder(key, num_rows, dim) as builder:
+    #       builder.add(ids, names, texts, embeddings)   # once per chunk
+    #       index = ann_index.build_index(builder.embeddings, config)
+    #       builder.commit(index, manifest)
+
+    def __init__(self, key, num_rows, dim, embedding_dtype=EMBEDDING_DTYPE, root=ARTIFACT_ROOT):
+        self.key = key
+        self.root = root
+        self.target = artifact_dir(key, root)
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        self.tmp = tempfile.mkdtemp(prefix=f".{key}-", dir=os.path.dirname(self.target))
+
+        self._embeddings = np.lib.format.open_memmap(
+            os.path.join(self.tmp, EMBEDDINGS_FILE), mode="w+", dtype=embedding_dtype, shape=(num_rows, dim)
+        )
+        self._ids = []
+        self._names = TextColumnWriter(self.tmp, "names")
+        self._texts = TextColumnWriter(self.tmp, "texts")
+        self._lexical = LexicalIndexWriter(self.tmp)
+        self._attributes = AttributeWriter(self.tmp)
+        self.rows = 0
+
+    @property
+    def embeddings(self):
+        return self._embeddings[:self.rows]
+
+    def add(self, ids, names, texts, embeddings, categories=None, prices=None):
+        count = len(embeddings)
+        self._embeddings[self.rows:self.rows + count] = embeddings
+        self._ids.extend(str(i) for i in ids)
+        names, texts = list(names), list(texts)
+        self._names.extend(names)
+        self._texts.extend(texts)
+        self._lexical.add(names, texts)
+        self._attributes.add(names, texts, categories, prices)
+        self.rows += count
+
+    def commit(self, index, manifest=None, replace=False):
+        # replace=True swaps out an existing build of the same key (build_index.py --force)
+        if self.rows != len(self._embeddings):
+            raise ValueError(f"Expected {len(self._embeddings)} rows, got {self.rows}")
+        self._embeddings.flush()
+        self._names.close()
+        self._texts.close()
+        self._lexical.close()
+        self._attributes.close()
+        write_ids(self.tmp, self._ids)
+        faiss.write_index(index, os.path.join(self.tmp, INDEX_FILE))
+
+        info = {
+            "format_version": FORMAT_VERSION,
+            "key": self.key,
+            "rows": self.rows,
+            "dim": int(self._embeddings.shape[1]),
+            "embedding_dtype": str(self._embeddings.dtype),
+        }
+        info.update(manifest or {})
+        # Manifest goes last: its presence marks the store as complete
+        with open(os.path.join(self.tmp, MANIFEST_FILE), "w") as f:
+            json.dump(info, f, indent=2)
+        del self._embeddings
+
+        old = None
+        if replace and os.path.exists(self.target):
+            # Move the old build aside first; processes that have it open keep their
+            # memory maps until they restart
+            old = tempfile.mkdtemp(prefix=f".{self.key}-old-", dir=os.path.dirname(self.target))
+            os.rename(self.target, os.path.join(old, self.key))
+        try:
+            os.rename(self.tmp, self.target)
+        except OSError:
+            # Another process finished the same build first; keep theirs
+            if not exists(self.key, self.root):
+                raise
+            shutil.rmtree(self.tmp, ignore_errors=True)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+        self.tmp = None
+        return self.target
+
+    def abort(self):
+        if self.tmp is not None:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            self.tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+
+def load(key, root=ARTIFACT_ROOT):
+    if not exists(key, root):
+        return None
+    path = artifact_dir(key, root)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), faiss.IO_FLAG_MMAP)
+    return {"catalog": CatalogStore(path), "index": index, "lexical": LexicalIndex(path),
+            "attributes": AttributeTable.load(path), "manifest": manifest}
+
+
+# A catalog that was updated incrementally (see live_catalog.py) is compacted into a
+# new artifact directory. A small pointer file next to the original build records
+# the newest one, so a restart serves the updated catalog rather than the original
+# parquet build.
+#
+# With several workers on one machine only one of them may update and compact the
+# catalog, or they would each move the pointer to their own version. The writer is
+# whoever holds an exclusive flock on {key}.writer; the lock goes away with the
+# process, so another worker can take over. The writer also removes the compactions
+# the pointer has moved past (remove_superseded).
+
+def _pointer_path(key, root):
+    return os.path.join(root, f"v{FORMAT_VERSION}", f"{key}.current")
+
+
+def resolve(key, root=ARTIFACT_ROOT):
+    try:
+        with open(_pointer_path(key, root)) as f:
+            current = f.read().strip()
+    except FileNotFoundError:
+        return key
+    return current if exists(current, root) else key
+
+
+def set_current(key, current, root=ARTIFACT_ROOT):
+    path = _pointer_path(key, root)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(current)
+    os.replace(tmp, path)
+
+
+def remove_superseded(key, grace_seconds, root=ARTIFACT_ROOT):
+    # Deletes compactions of key (manifest "root" == key) that the pointer has moved
+    # past, once grace_seconds have passed since it moved so every worker has reloaded.
+    # Directories newer than the pointer belong to a compaction that hasn't been
+    # published yet and are kept. Returns the removed keys.
+    try:
+        moved = os.path.getmtime(_pointer_path(key, root))
+    except FileNotFoundError:
+        return []
+    if time.time() - moved < grace_seconds:
+        return []
+    current = resolve(key, root)
+    base = os.path.join(root, f"v{FORMAT_VERSION}")
+    removed = []
+    for name in os.listdir(base):
+        path = os.path.join(base, name)
+        if name in (key, current) or name.startswith(".") or os.path.getmtime(path) > moved:
+            continue
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if manifest.get("root") == key:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def acquire_writer(key, root=ARTIFACT_ROOT):
+    # Open lock file if this process is now the writer for key, else None
+    if fcntl is None:
+        return True
+    path = os.path.join(root, f"v{FORMAT_VERSION}", f"{key}.writer")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = open(path, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
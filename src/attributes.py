@@ -0,0 +1,233 @@
+import json
+import os
+import re
+
+import numpy as np
+
+# Structured attributes parsed out of free text, for product names and text as well
+# as the phrases users ask for ("nail paint of blue color", "1kg horlicks pack").
+
+# Order matters: a colour's position is its bit in colour bitsets
+COLOURS = (
+    "black", "white", "red", "blue", "green", "yellow", "pink", "purple", "orange", "brown",
+    "grey", "silver", "gold", "beige", "navy", "maroon", "violet", "multicolor",
+)
+COLOUR_ALIASES = {"gray": "grey", "multicolour": "multicolor", "multi": "multicolor", "golden": "gold"}
+
+COLOUR_PATTERN = re.compile(r"\b(" + "|".join(COLOURS + tuple(COLOUR_ALIASES)) + r")\b")
+
+# unit -> (dimension, factor to the dimension's base unit)
+UNITS = {
+    "kg": ("g", 1000), "g": ("g", 1), "gm": ("g", 1), "gms": ("g", 1), "gram": ("g", 1), "grams": ("g", 1),
+    "mg": ("g", 0.001), "lb": ("g", 453.592), "lbs": ("g", 453.592), "oz": ("g", 28.3495),
+    "l": ("ml", 1000), "ltr": ("ml", 1000), "litre": ("ml", 1000), "liter": ("ml", 1000), "ml": ("ml", 1),
+    "mm": ("mm", 1), "cm": ("mm", 10), "m": ("mm", 1000), "in": ("mm", 25.4), "inch": ("mm", 25.4),
+    "ft": ("mm", 304.8), "gb": ("gb", 1), "tb": ("gb", 1024), "mah": ("mah", 1), "w": ("w", 1),
+    "pack": ("count", 1), "pcs": ("count", 1), "pieces": ("count", 1), "count": ("count", 1),
+}
+
+# Units that are also ordinary words only count when attached to the number: "3in",
+# "1m" and "5w", but not "3 in 1 shampoo"
+ATTACHED_UNITS = ("in", "m", "w")
+
+SIZE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(?:\s+(?!(?:" + "|".join(ATTACHED_UNITS) + r")\b))?("
+                          + "|".join(sorted(UNITS, key=len, reverse=True)) + r")\b")
+
+
+def colours(text):
+    if not text:
+        return set()
+    found = COLOUR_PATTERN.findall(str(text).lower())
+    return {COLOUR_ALIASES.get(c, c) for c in found}
+
+
+def colour_bits(names):
+    bits = 0
+    for name in names:
+        bits |= 1 << COLOURS.index(name)
+    return bits
+
+
+def sizes(text):
+    # {(dimension, value in base units)}, e.g. "1kg" and "1000 g" both give ("g", 1000.0)
+    if not text:
+        return set()
+    found = set()
+    for value, unit in SIZE_PATTERN.findall(str(text).lower()):
+        dimension, factor = UNITS[unit]
+        found.add((dimension, round(float(value) * factor, 1)))
+    return found
+
+
+# Per-product attribute columns, extracted once at ingestion and stored next to the
+# catalog (see artifact_store.py):
+#   attr_colours.npy     - uint32 colour bitset (bit i = COLOURS[i]) from name and text
+#   attr_size_dim.npy    - uint8 code of the product's main size (0 = none, else
+#                          SIZE_DIMENSIONS index + 1); attr_size_value.npy holds the value
+#   attr_price.npy       - float32 selling price, NaN when unknown
+#   attr_category.npy    - int32 code into attr_categories.json (-1 = none)
+# Filters turn into one boolean mask over all rows with a few vectorised comparisons.
+# The mask is handed to FAISS as an IDSelector, so nearest-neighbour search only
+# visits products that pass (see live_catalog.CatalogSnapshot.search).
+
+SIZE_DIMENSIONS = ("g", "ml", "mm", "gb", "mah", "w", "count")
+
+PRICE_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+CURRENCY = r"(?:rs\.?|inr|\$|₹|usd|rupees|dollars)"
+AMOUNT = r"(\d+(?:\.\d+)?)"
+
+
+def price_bound_pattern(*words):
+    # A bound only counts next to a currency or the word "price" ("under $20",
+    # "under 500 rs", "price below 300", "max price 50"), so "iphone 15 pro max 256gb"
+    # isn't a price filter
+    bound = "(?:" + "|".join(words) + ")"
+    return re.compile(rf"\bprice\s+(?:is\s+)?{bound}\s*{CURRENCY}?\s*{AMOUNT}"
+                      rf"|\b{bound}\s+price\s+(?:of\s+)?{CURRENCY}?\s*{AMOUNT}"
+                      rf"|\b{bound}\s*{CURRENCY}\s*{AMOUNT}"
+                      rf"|\b{bound}\s*{AMOUNT}\s*{CURRENCY}(?![a-z])")
+
+
+MAX_PRICE_PATTERN = price_bound_pattern("under", "below", "less than", "cheaper than", "upto", "up to", "max",
+                                        "maximum", "within")
+MIN_PRICE_PATTERN = price_bound_pattern("over", "above", "more than", "at least", "min", "minimum")
+
+
+def primary_size(name, text=None):
+    # The first size in the name, else in the text: ("g", 1000.0) or None
+    for value in (name, text):
+        if value:
+            match = SIZE_PATTERN.search(str(value).lower())
+            if match:
+                dimension, factor = UNITS[match.group(2)]
+                return dimension, round(float(match.group(1)) * factor, 1)
+    return None
+
+
+def parse_price(value):
+    # "$15.99", "$15.99 - $43.97" (lower bound), 15.99 or None
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = PRICE_PATTERN.search(str(value))
+    return float(match.group(0).replace(",", "")) if match else np.nan
+
+
+def parse_filters(phrase):
+    # Hard filters implied by a shopping-list phrase; {} when it has none
+    filters = {}
+    found = colours(phrase)
+    if found:
+        filters["colours"] = found
+    found = sizes(phrase)
+    if found:
+        filters["sizes"] = found
+    text = str(phrase or "").lower()
+    for name, pattern in (("max_price", MAX_PRICE_PATTERN), ("min_price", MIN_PRICE_PATTERN)):
+        match = pattern.search(text)
+        if match:
+            filters[name] = float(next(group for group in match.groups() if group is not None))
+    return filters
+
+
+class AttributeTable:
+    FILES = ("colours", "size_dim", "size_value", "price", "category")
+
+    def __init__(self, colours, size_dim, size_value, price, category, categories):
+        self.colours = colours
+        self.size_dim = size_dim
+        self.size_value = size_value
+        self.price = price
+        self.category = category
+        self.categories = categories
+        self._category_codes = {path: code for code, path in enumerate(categories)}
+
+    @classmethod
+    def extract(cls, names, texts, categories, prices):
+        names, texts = list(names), list(texts)
+        colour_column = np.zeros(len(names), dtype=np.uint32)
+        size_dim = np.zeros(len(names), dtype=np.uint8)
+        size_value = np.zeros(len(names), dtype=np.float32)
+        for row, (name, text) in enumerate(zip(names, texts)):
+            colour_column[row] = colour_bits(colours(name) or colours(text))
+            size = primary_size(name, text)
+            if size is not None:
+                size_dim[row] = SIZE_DIMENSIONS.index(size[0]) + 1
+                size_value[row] = size[1]
+
+        vocabulary = {}
+        category = np.full(len(names), -1, dtype=np.int32)
+        for row, path in enumerate(categories if categories is not None else [None] * len(names)):
+            if path:
+                category[row] = vocabulary.setdefault(str(path).strip(), len(vocabulary))
+        price = np.asarray([parse_price(p) for p in (prices if prices is not None else [None] * len(names))],
+                           dtype=np.float32)
+        return cls(colour_column, size_dim, size_value, price, category, list(vocabulary))
+
+    @classmethod
+    def empty(cls):
+        return cls.extract([], [], [], [])
+
+    @classmethod
+    def load(cls, directory):
+        columns = [np.load(os.path.join(directory, f"attr_{name}.npy"), mmap_mode="r") for name in cls.FILES]
+        with open(os.path.join(directory, "attr_categories.json")) as f:
+            categories = json.load(f)
+        return cls(*columns, categories)
+
+    def __len__(self):
+        return len(self.colours)
+
+    def concat(self, *others):
+        # Rows of others appended; their category codes are remapped into this vocabulary
+        codes = dict(self._category_codes)
+        category = [self.category]
+        for other in others:
+            remap = np.asarray([codes.setdefault(path, len(codes)) for path in other.categories] + [-1], dtype=np.int32)
+            category.append(remap[other.category])
+        tables = (self,) + others
+        return AttributeTable(
+            *(np.concatenate([getattr(t, name) for t in tables]) for name in ("colours", "size_dim", "size_value", "price")),
+            np.concatenate(category), list(codes),
+        )
+
+    def row(self, row):
+        # Values for one row, in the form AttributeTable.extract takes them back
+        code = int(self.category[row])
+        return self.categories[code] if code >= 0 else None, float(self.price[row])
+
+    def mask(self, filters):
+        keep = np.ones(len(self), dtype=bool)
+        if filters.get("colours"):
+            keep &= (self.colours & np.uint32(colour_bits(filters["colours"]))) != 0
+        if filters.get("sizes"):
+            size_match = np.zeros(len(self), dtype=bool)
+            for dimension, value in filters["sizes"]:
+                size_match |= (self.size_dim == SIZE_DIMENSIONS.index(dimension) + 1) & np.isclose(self.size_value, value)
+            keep &= size_match
+        if filters.get("category"):
+            term = filters["category"].lower()
+            codes = [code for code, path in enumerate(self.categories) if term in path.lower()]
+            keep &= np.isin(self.category, codes)
+        if filters.get("min_price") is not None:
+            keep &= self.price >= filters["min_price"]
+        if filters.get("max_price") is not None:
+            keep &= self.price <= filters["max_price"]
+        return keep
+
+
+class AttributeWriter:
+    def __init__(self, directory):
+        self.directory = directory
+        self._parts = []
+
+    def add(self, names, texts, categories=None, prices=None):
+        self._parts.append(AttributeTable.extract(names, texts, categories, prices))
+
+    def close(self):
+        table = AttributeTable.empty().concat(*self._parts)
+        for name in AttributeTable.FILES:
+            np.save(os.path.join(self.directory, f"attr_{name}.npy"), getattr(table, name))
+        with open(os.path.join(self.directory, "attr_categories.json"), "w") as f:
+            json.dump(table.categories, f)
@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+import ann_index
+import artifact_store
+from catalog import EMBED_MODEL_NAME, encode_texts, fetch_catalog
+from ingest import build_artifacts
+
+load_dotenv()
+
+# Compare ANN index backends against exact flat search on the product catalog.
+# Queries are product names of randomly sampled catalog rows, which is close to
+# what the endpoints send. For each backend and search setting it reports
+# recall@k against the flat index and single-query latency.
+#   python bench_ann.py --k 10 --nprobe 4 16 64 --ef-search 32 64 128
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recall@k and latency of ANN backends vs. the flat index")
+    parser.add_argument("--catalog", default=None, help="Local parquet file (defaults to the HF dataset)")
+    parser.add_argument("--kinds", nargs="+", default=["ivf_flat", "ivf_pq", "hnsw"], choices=ann_index.INDEX_KINDS)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def load_embeddings(catalog_path):
+    # Prefer the flat artifacts the API already built; otherwise encode from scratch
+    key = artifact_store.make_key(artifact_store.file_digest(catalog_path), EMBED_MODEL_NAME, "flat")
+    artifacts = artifact_store.load(key)
+    if artifacts is not None:
+        return artifacts["catalog"].embeddings
+    print("No flat artifacts found, building them (same as build_index.py --index-kind flat)")
+    config = dict(ann_index.config_from_env(), kind="flat")
+    build_artifacts(catalog_path, key, SentenceTransformer(EMBED_MODEL_NAME), config, manifest={"model": EMBED_MODEL_NAME})
+    return artifact_store.load(key)["catalog"].embeddings
+
+
+def search_latency(index, queries, k):
+    timings = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        timings.append(time.perf_counter() - start)
+        results[i] = found[0]
+    timings = np.array(timings) * 1000
+    return results, np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def recall_at_k(truth, found):
+    hits = [len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found)]
+    return float(np.mean(hits)) / truth.shape[1]
+
+
+def main():
+    args = parse_args()
+    catalog_path = args.catalog or fetch_catalog()
+    embeddings = load_embeddings(catalog_path)
+
+    names = pd.read_parquet(catalog_path, columns=["Product Name"])["Product Name"]
+    rows = np.random.default_rng(args.seed).choice(len(names), min(args.num_queries, len(names)), replace=False)
+    embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+    queries = encode_texts(embed_model, names.iloc[rows].tolist())
+
+    config = ann_index.config_from_env()
+    flat = ann_index.build_index(embeddings, dict(config, kind="flat"))
+    truth, p50, p99 = search_latency(flat, queries, args.k)
+
+    print(f"{len(embeddings)} products, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<32}{'param':>12}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}")
+    print(f"{'flat':<32}{'-':>12}{1.0:>10.3f}{p50:>9.3f}{p99:>9.3f}{'-':>9}")
+
+    for kind in args.kinds:
+        kind_config = dict(config, kind=kind)
+        start = time.perf_counter()
+        index = ann_index.build_index(embeddings, kind_config)
+        build_seconds = time.perf_counter() - start
+
+        if kind == "hnsw":
+            sweep = [("efSearch", value, {"ef_search": value}) for value in args.ef_search]
+        elif kind == "flat":
+            sweep = [("-", "-", {})]
+        else:
+            sweep = [("nprobe", value, {"nprobe": value}) for value in args.nprobe]
+
+        for name, value, params in sweep:
+            ann_index.set_search_params(index, **params)
+            found, p50, p99 = search_latency(index, queries, args.k)
+            label = f"{name}={value}" if params else "-"
+            print(f"{ann_index.describe(kind_config):<32}{label:>12}{recall_at_k(truth, found):>10.3f}"
+                  f"{p50:>9.3f}{p99:>9.3f}{build_seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+from catalog import EMBED_MODEL_NAME
+from fake_llm import FakeGenerativeModel, canned_response
+from intent_classifier import IntentClassifier
+from intents import extract_intent
+from llm_client import AsyncLLMClient
+
+load_dotenv()
+
+# Accuracy and latency of the local intent classifier against the Gemini path, on a
+# labelled file with one JSON object per line:
+#   {"text": "...", "intent": "add the products", "products": ["...", ...]}
+# For each confidence threshold it reports coverage (share answered locally), intent
+# accuracy and exact product-list accuracy on the covered utterances, and the
+# end-to-end accuracy when the rest fall back to Gemini. With --gemini (and
+# GOOGLE_API_KEY) the fallback answers come from the real model; otherwise a fake
+# model with Gemini-like latency stands in, so only the latency numbers are meaningful.
+#   python bench_intent.py --data ../data/intent_eval.jsonl --gemini
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local intent classifier vs. Gemini: accuracy, coverage, latency")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), "..", "data", "intent_eval.jsonl"))
+    parser.add_argument("--thresholds", default="0.5,0.6,0.75,0.9")
+    parser.add_argument("--gemini", action="store_true", help="Call the real model for the fallback")
+    parser.add_argument("--latency", type=float, default=0.8, help="Fake model latency without --gemini")
+    parser.add_argument("--verbose", action="store_true", help="Print every local mistake")
+    return parser.parse_args()
+
+
+def load_examples(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def same_products(predicted, expected):
+    normalize = lambda items: sorted(" ".join(str(p).lower().split()) for p in items or [])
+    return normalize(predicted) == normalize(expected)
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return np.percentile(values, 50), np.percentile(values, 99)
+
+
+async def gemini_answers(examples, model):
+    client = AsyncLLMClient(model, max_concurrency=4, timeout=60)
+    answers, timings = [], []
+    for example in examples:
+        start = time.perf_counter()
+        answers.append(await extract_intent(client, example["text"]))
+        timings.append(time.perf_counter() - start)
+    return answers, timings
+
+
+def main():
+    args = parse_args()
+    examples = load_examples(args.data)
+    classifier = IntentClassifier(SentenceTransformer(EMBED_MODEL_NAME))
+
+    local, local_timings = [], []
+    for example in examples:
+        start = time.perf_counter()
+        local.append(classifier.classify(example["text"]))
+        local_timings.append(time.perf_counter() - start)
+
+    if args.gemini:
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        model = genai.GenerativeModel("gemini-1.5-pro")
+    else:
+        model = FakeGenerativeModel(latency=args.latency, respond=canned_response, seed=0)
+    gemini, gemini_timings = asyncio.run(gemini_answers(examples, model))
+
+    total = len(examples)
+    gemini_intent = sum(intent == e["intent"] for (intent, _), e in zip(gemini, examples)) / total
+    print(f"{total} utterances from {args.data}")
+    print(f"{'path':<10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, timings in (("local", local_timings), ("gemini", gemini_timings)):
+        p50, p99 = percentiles(timings)
+        print(f"{name:<10}{p50:>10.2f}{p99:>10.2f}")
+    print(f"gemini alone: intent accuracy {gemini_intent:.3f}" + ("" if args.gemini else " (fake model)"))
+
+    print(f"{'threshold':<11}{'coverage':>9}{'intent':>8}{'products':>10}{'combined':>10}{'mean ms':>9}")
+    for threshold in map(float, args.thresholds.split(",")):
+        covered = [i for i, result in enumerate(local) if result.confidence >= threshold]
+        intent_ok = sum(local[i].intent == examples[i]["intent"] for i in covered)
+        products_ok = sum(same_products(local[i].products, examples[i]["products"]) for i in covered)
+        combined = intent_ok + sum(gemini[i][0] == examples[i]["intent"] for i in range(total) if i not in covered)
+        # Expected latency per utterance: local always runs, Gemini only for the rest
+        mean_ms = 1000 * (sum(local_timings) + sum(gemini_timings[i] for i in range(total) if i not in covered)) / total
+        n = max(len(covered), 1)
+        print(f"{threshold:<11.2f}{len(covered) / total:>9.3f}{intent_ok / n:>8.3f}{products_ok / n:>10.3f}"
+              f"{combined / total:>10.3f}{mean_ms:>9.1f}")
+
+    if args.verbose:
+        for result, example in zip(local, examples):
+            if result.intent != example["intent"] or not same_products(result.products, example["products"]):
+                print(f"{result.confidence:.2f} {example['text']!r}: {getattr(result.intent, 'value', None)} {result.products}"
+                      f" (expected {example['intent']} {example['products']})")
+
+
+if __name__ == "__main__":
+    main()
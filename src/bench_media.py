@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+
+from intents import extract_intent_from_media
+from llm_client import AsyncLLMClient
+from media_preprocess import preprocess_audio, preprocess_image
+
+load_dotenv()
+
+# Payload size and latency of image / audio uploads with and without preprocessing,
+# on the samples in data/. The upload times are for the phone -> frontend hop (the
+# user's uplink), which is where the page's in-browser preprocessing saves time; the
+# frontend -> API hop runs on one machine and isn't modelled. The processed files
+# and prep times come from media_preprocess.py, the server-side fallback with the
+# same settings, as a stand-in for what the browser sends (its Opus audio comes out
+# a little smaller than this MP3). For each file it reports the bytes sent, the
+# time spent preprocessing, and the upload time on a few uplink speeds
+# (bytes / bandwidth + one round trip). With --gemini (and GOOGLE_API_KEY) it also
+# times the single-pass intent call on both payloads and prints what the model
+# read, so the end-to-end total and the transcript quality can be compared:
+#   python bench_media.py --gemini
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+SAMPLES = [("image", "shopping_list.jpg", "image/jpeg"), ("audio", "sampleAudio.mp3", "audio/mp3")]
+# name -> (phone uplink bits per second, round trip seconds)
+NETWORKS = {"3g": (0.75e6, 0.3), "4g": (5e6, 0.08), "wifi": (20e6, 0.02)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Phone upload size and latency with and without media preprocessing")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--repeats", type=int, default=5, help="Preprocessing runs to time per file")
+    parser.add_argument("--gemini", action="store_true", help="Also time the single-pass Gemini call")
+    return parser.parse_args()
+
+
+def upload_seconds(size, network):
+    bandwidth, rtt = NETWORKS[network]
+    return size * 8 / bandwidth + rtt
+
+
+def time_preprocess(preprocess, data, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = preprocess(data)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+async def time_gemini(model, kind, data, mime_type):
+    client = AsyncLLMClient(model)
+    start = time.perf_counter()
+    transcript, intent, products = await extract_intent_from_media(client, {"mime_type": mime_type, "data": data}, kind)
+    return time.perf_counter() - start, transcript, intent, products
+
+
+def main():
+    args = parse_args()
+    model = None
+    if args.gemini:
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        model = genai.GenerativeModel("gemini-1.5-pro")
+
+    header = f"{'file':<20}{'payload':<10}{'bytes':>9}{'prep ms':>9}" + "".join(f"{n + ' ms':>10}" for n in NETWORKS)
+    if model is not None:
+        header += f"{'gemini ms':>11}{'total 4g ms':>13}"
+    print(header)
+
+    preprocessors = {"image": preprocess_image, "audio": preprocess_audio}
+    for kind, filename, mime_type in SAMPLES:
+        with open(os.path.join(args.data_dir, filename), "rb") as f:
+            original = f.read()
+        (processed, processed_type), prep = time_preprocess(preprocessors[kind], original, args.repeats)
+        if processed_type is None:
+            print(f"{filename:<20}preprocessing unavailable for this file (see media_preprocess.py)")
+
+        for label, data, data_type, seconds in (("original", original, mime_type, 0.0),
+                                                ("processed", processed, processed_type or mime_type, prep)):
+            line = f"{filename:<20}{label:<10}{len(data):>9}{seconds * 1000:>9.1f}"
+            line += "".join(f"{upload_seconds(len(data), n) * 1000:>10.0f}" for n in NETWORKS)
+            if model is not None:
+                gemini, transcript, intent, products = asyncio.run(time_gemini(model, kind, data, data_type))
+                total = seconds + upload_seconds(len(data), "4g") + gemini
+                line += f"{gemini * 1000:>11.0f}{total * 1000:>13.0f}"
+                line += f"\n    {transcript!r} -> {intent.value if intent else None} {products}"
+            print(line)
+        print(f"{filename:<20}{'saved':<10}{1 - len(processed) / len(original):>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Micro-benchmark for cart matching: the old path (sklearn cosine_similarity on
+# Python lists of vectors) against the current one (one NumPy matmul over stored,
+# L2-normalized float32 embeddings). Also reports what importing sklearn costs at
+# startup. sklearn is only needed to run the old path here, not by the API.
+#   python bench_similarity.py --cart-sizes 5 20 100 500
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cart similarity: sklearn cosine_similarity vs. normalized matmul")
+    parser.add_argument("--cart-sizes", type=int, nargs="+", default=[5, 20, 100, 500])
+    parser.add_argument("--phrases", type=int, default=1, help="Phrases matched per call")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeats", type=int, default=2000)
+    return parser.parse_args()
+
+
+def per_call_us(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def import_seconds(module):
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return float(result.stdout) if result.returncode == 0 else None
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+
+    try:
+        from sklearn.metrics.pairwise import cosine_similarity
+    except ImportError:
+        cosine_similarity = None
+        print("sklearn not installed, only timing the matmul path")
+
+    print(f"{'cart size':>10}{'sklearn us':>14}{'matmul us':>12}{'speed-up':>10}")
+    for size in args.cart_sizes:
+        raw_cart = rng.standard_normal((size, args.dim)).astype(np.float32)
+        raw_inputs = rng.standard_normal((args.phrases, args.dim)).astype(np.float32)
+
+        # What remove_from_cart used to build: Python lists of per-item vectors
+        cart_list = list(raw_cart)
+        inputs_list = list(raw_inputs)
+
+        # What it uses now: normalized matrices, normalized once at encode time
+        cart = raw_cart / np.linalg.norm(raw_cart, axis=1, keepdims=True)
+        inputs = raw_inputs / np.linalg.norm(raw_inputs, axis=1, keepdims=True)
+
+        matmul = per_call_us(lambda: inputs @ cart.T, args.repeats)
+        if cosine_similarity is not None:
+            sklearn = per_call_us(lambda: cosine_similarity(inputs_list, cart_list), args.repeats)
+            print(f"{size:>10}{sklearn:>14.1f}{matmul:>12.1f}{sklearn / matmul:>9.1f}x")
+        else:
+            print(f"{size:>10}{'-':>14}{matmul:>12.1f}{'-':>10}")
+
+    sklearn_import = import_seconds("sklearn.metrics.pairwise")
+    numpy_import = import_seconds("numpy")
+    if sklearn_import is not None:
+        print(f"import sklearn.metrics.pairwise: {sklearn_import * 1000:.0f} ms (numpy alone: {numpy_import * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
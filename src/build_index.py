@@ -0,0 +1,68 @@
+import argparse
+import os
+
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+import ann_index
+import artifact_store
+from catalog import EMBED_MODEL_NAME, count_rows, fetch_catalog
+from ingest import build_artifacts
+
+load_dotenv()
+
+# Offline index build: run this after every catalog refresh so API replicas start warm.
+#   python build_index.py --batch-size 256 --workers 4
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the product embedding artifacts for the ShopGenie API")
+    parser.add_argument("--catalog", default=None, help="Local parquet file (defaults to the HF dataset)")
+    parser.add_argument("--chunk-rows", type=int, default=8192, help="Rows per streamed batch (row groups are split to this size)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Encoder batch size")
+    parser.add_argument("--workers", type=int, default=1, help="Encoder processes (useful on CPU-only hosts)")
+    parser.add_argument("--index-kind", choices=ann_index.INDEX_KINDS, default=None,
+                        help="Index backend (defaults to INDEX_KIND, see ann_index.py)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if artifacts already exist")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    catalog_path = args.catalog or fetch_catalog()
+
+    index_config = ann_index.config_from_env()
+    if args.index_kind:
+        index_config["kind"] = args.index_kind
+    index_spec = ann_index.describe(index_config)
+
+    key = artifact_store.make_key(artifact_store.file_digest(catalog_path), EMBED_MODEL_NAME, index_spec)
+    if artifact_store.exists(key) and not args.force:
+        print(f"Artifacts {key} already built at {artifact_store.artifact_dir(key)}")
+        return
+
+    total_rows = count_rows(catalog_path)
+    print(f"Encoding {total_rows} products with {EMBED_MODEL_NAME} "
+          f"(batch size {args.batch_size}, {args.workers} worker(s))")
+
+    embed_model = SentenceTransformer(EMBED_MODEL_NAME, device="cpu" if args.workers > 1 else None)
+    pool = None
+    if args.workers > 1:
+        # One torch thread per process, otherwise the workers fight over the same cores
+        os.environ.setdefault("OMP_NUM_THREADS", "1")
+        pool = embed_model.start_multi_process_pool(target_devices=["cpu"] * args.workers)
+
+    try:
+        path = build_artifacts(catalog_path, key, embed_model, index_config, args.chunk_rows, args.batch_size,
+                               pool, {"model": EMBED_MODEL_NAME}, replace=args.force)
+    finally:
+        if pool is not None:
+            embed_model.stop_multi_process_pool(pool)
+    print(f"Built {total_rows} rows -> {path}")
+    if artifact_store.resolve(key) != key:
+        print(f"Note: the API serves the compacted catalog {artifact_store.resolve(key)} for this key "
+              f"(see live_catalog.py); delete {key}.current to serve this build instead")
+
+
+if __name__ == "__main__":
+    main()
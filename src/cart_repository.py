@@ -0,0 +1,221 @@
+import json
+import os
+import queue
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Cart storage backends behind one interface (CartRepository), picked with CART_BACKEND:
+#   sqlite - SQLiteCartRepository, one database file shared by the workers on a host
+#   redis  - RedisCartRepository, shared by every API replica behind the load balancer
+#   memory - RedisCartRepository over the in-process fake_redis.FakeRedis, for tests
+#
+# SQLite: file-backed database, shared by every uvicorn worker on the host.
+#   - WAL mode: readers never block the writer and vice versa; writers from other
+#     processes wait up to busy_timeout instead of failing
+#   - a fixed pool of connections, each used by one thread at a time
+#   - SQL lives in module constants so each connection's statement cache keeps them
+#     prepared across calls
+#   - multi-item adds and removes run in one transaction
+# The table is WITHOUT ROWID with PRIMARY KEY (user_id, product_id), so the primary key
+# is the user_id index and a user's items are stored next to each other.
+#
+# Carts only hold references: product_id, quantity and a small attributes dict (the
+# phrase the user asked for and the product name, so a line can still be shown and
+# removed after its product leaves the catalog). Names, details and embeddings are
+# resolved from the shared product catalog when needed.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cart_items (
+    user_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    attributes TEXT,
+    PRIMARY KEY (user_id, product_id)
+) WITHOUT ROWID
+"""
+
+UPSERT_ITEM = """
+INSERT INTO cart_items (user_id, product_id, quantity, attributes) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+RETURNING quantity
+"""
+SELECT_ITEMS = "SELECT product_id, quantity, attributes FROM cart_items WHERE user_id = ?"
+DECREMENT_ITEM = "UPDATE cart_items SET quantity = quantity - 1 WHERE user_id = ? AND product_id = ?"
+DELETE_EMPTY = "DELETE FROM cart_items WHERE user_id = ? AND quantity <= 0"
+
+
+def pack_attributes(attributes):
+    return json.dumps(attributes or {}, separators=(",", ":"))
+
+
+def unpack_attributes(value):
+    return json.loads(value) if value else {}
+
+
+class CartRepository(ABC):
+    # Items are dicts with product_id, quantity and attributes
+
+    @abstractmethod
+    def add_many(self, user_id, items):
+        # Adding a product that is already in the cart increases its quantity.
+        # Returns the resulting quantity of each item.
+        pass
+
+    @abstractmethod
+    def get(self, user_id):
+        pass
+
+    @abstractmethod
+    def remove_many(self, user_id, product_ids):
+        # Takes one unit of each product out of the cart; a line is deleted when its
+        # quantity reaches zero. Returns the number of units removed.
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteCartRepository(CartRepository):
+    def __init__(self, path, pool_size=4, busy_timeout=30.0):
+        self.path = path
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect(busy_timeout))
+
+        with self.connection() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self, busy_timeout):
+        # isolation_level=None: transactions are opened explicitly in transaction()
+        conn = sqlite3.connect(self.path, timeout=busy_timeout, check_same_thread=False,
+                               isolation_level=None, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def add_many(self, user_id, items):
+        quantities = []
+        with self.transaction() as conn:
+            for item in items:
+                row = conn.execute(UPSERT_ITEM, (
+                    user_id, item["product_id"], item.get("quantity", 1), pack_attributes(item.get("attributes"))
+                )).fetchone()
+                quantities.append(row[0])
+        return quantities
+
+    def get(self, user_id):
+        with self.connection() as conn:
+            rows = conn.execute(SELECT_ITEMS, (user_id,)).fetchall()
+        return [
+            {"product_id": row[0], "quantity": row[1], "attributes": unpack_attributes(row[2])}
+            for row in rows
+        ]
+
+    def remove_many(self, user_id, product_ids):
+        with self.transaction() as conn:
+            cursor = conn.executemany(DECREMENT_ITEM, [(user_id, product_id) for product_id in product_ids])
+            conn.execute(DELETE_EMPTY, (user_id,))
+            return cursor.rowcount
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class RedisCartRepository(CartRepository):
+    # Each cart is two hashes keyed by user, so every per-item operation is O(1):
+    #   cart:{user_id}       product_id -> quantity (HINCRBY)
+    #   cart-attr:{user_id}  product_id -> JSON attributes
+    # Multi-item operations go out as one pipeline (a single round trip).
+
+    def __init__(self, client, prefix="cart"):
+        self.client = client
+        self.prefix = prefix
+
+    def _keys(self, user_id):
+        return f"{self.prefix}:{user_id}", f"{self.prefix}-attr:{user_id}"
+
+    def add_many(self, user_id, items):
+        quantities_key, attributes_key = self._keys(user_id)
+        pipe = self.client.pipeline()
+        for item in items:
+            pipe.hincrby(quantities_key, item["product_id"], item.get("quantity", 1))
+            # Attributes of the first add are kept, like the SQLite backend
+            pipe.hsetnx(attributes_key, item["product_id"], pack_attributes(item.get("attributes")))
+        results = pipe.execute()
+        return [int(q) for q in results[::2]]
+
+    def get(self, user_id):
+        quantities_key, attributes_key = self._keys(user_id)
+        pipe = self.client.pipeline()
+        pipe.hgetall(quantities_key)
+        pipe.hgetall(attributes_key)
+        quantities, attributes = pipe.execute()
+
+        return [
+            {
+                "product_id": product_id.decode("utf-8") if isinstance(product_id, bytes) else product_id,
+                "quantity": int(quantity),
+                "attributes": unpack_attributes(attributes.get(product_id))
+            }
+            for product_id, quantity in quantities.items()
+        ]
+
+    def remove_many(self, user_id, product_ids):
+        if not product_ids:
+            return 0
+        quantities_key, attributes_key = self._keys(user_id)
+        pipe = self.client.pipeline()
+        for product_id in product_ids:
+            pipe.hincrby(quantities_key, product_id, -1)
+        remaining = pipe.execute()
+
+        # Lines that reached zero (or never existed and went negative) are deleted
+        empty = [product_id for product_id, quantity in zip(product_ids, remaining) if int(quantity) <= 0]
+        if empty:
+            pipe = self.client.pipeline()
+            pipe.hdel(quantities_key, *empty)
+            pipe.hdel(attributes_key, *empty)
+            pipe.execute()
+        return sum(int(quantity) >= 0 for quantity in remaining)
+
+    def close(self):
+        self.client.close()
+
+
+def cart_repository_from_env():
+    backend = os.getenv("CART_BACKEND", "sqlite")
+    if backend == "sqlite":
+        return SQLiteCartRepository(
+            os.getenv("CART_DB_PATH", "../data/cart.db"),
+            pool_size=int(os.getenv("CART_DB_POOL_SIZE", "4"))
+        )
+    if backend == "redis":
+        import redis
+
+        return RedisCartRepository(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    if backend == "memory":
+        from fake_redis import FakeRedis
+
+        return RedisCartRepository(FakeRedis())
+    raise ValueError(f"Unknown CART_BACKEND '{backend}', expected sqlite, redis or memory")
@@ -0,0 +1,58 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from huggingface_hub import hf_hub_download
+
+# Shared catalog helpers used by the API (main.py) and the offline index build (build_index.py)
+
+DATASET_REPO = "philschmid/amazon-product-descriptions-vlm"
+DATASET_FILE = "data/train-00000-of-00001.parquet"
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+
+TEXT_COLUMNS = ["Uniq Id", "Product Name", "About Product", "Product Specification", "Technical Details", "description"]
+# Turned into filterable attribute columns at ingestion (see attributes.py)
+ATTRIBUTE_COLUMNS = ["Category", "Selling Price"]
+
+
+def fetch_catalog():
+    # Download into the local HF cache so the artifact store can fingerprint the exact file
+    return hf_hub_download(repo_id=DATASET_REPO, filename=DATASET_FILE, repo_type="dataset")
+
+
+COMBINED_TEXT_PARTS = [
+    ("About Product: ", "About Product"),
+    ("\nProduct Specification: ", "Product Specification"),
+    ("\nTechnical Details: ", "Technical Details"),
+    ("\nDescription: ", "description"),
+]
+
+
+def combined_text(batch):
+    # Vectorised over an Arrow record batch or table: one string kernel call for the
+    # whole batch instead of a Python f-string per row. Missing values render as
+    # "None", exactly like the old row-wise version, so embeddings do not change.
+    parts = []
+    for label, column in COMBINED_TEXT_PARTS:
+        parts.append(pa.scalar(label))
+        parts.append(pc.cast(batch.column(column), pa.string()))
+    return pc.binary_join_element_wise(*parts, "", null_handling="replace", null_replacement="None")
+
+
+def count_rows(path):
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def encode_texts(model, texts, batch_size=256, pool=None):
+    # Every embedding in the system is L2-normalized float32, so inner product is
+    # cosine similarity for the catalog index and for cart matching alike
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    if pool is not None:
+        embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size, normalize_embeddings=True)
+    else:
+        embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                  normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(embeddings, dtype=np.float32)
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+# Read side of the product catalog, served straight from the artifact directory:
+#   ids.npy                  - fixed-width ASCII Uniq Ids, one per row
+#   id_order.npy             - argsort of ids, for O(log n) id -> row lookups
+#   names.bin / names.idx.npy - product names, UTF-8 back to back + row offsets
+#   texts.bin / texts.idx.npy - combined product text, same layout
+#   embeddings.npy           - float32 or float16 embedding matrix
+# Everything is memory-mapped read-only, so forked uvicorn workers share the same
+# page cache instead of each holding a pandas frame, and long texts are only read
+# for the rows a request actually touches.
+
+
+class TextColumnWriter:
+    def __init__(self, directory, name):
+        self._data_path = os.path.join(directory, f"{name}.bin")
+        self._offsets_path = os.path.join(directory, f"{name}.idx.npy")
+        self._file = open(self._data_path, "wb")
+        self._offsets = [0]
+
+    def extend(self, values):
+        for value in values:
+            encoded = ("" if value is None else str(value)).encode("utf-8")
+            self._file.write(encoded)
+            self._offsets.append(self._offsets[-1] + len(encoded))
+
+    def close(self):
+        self._file.close()
+        np.save(self._offsets_path, np.asarray(self._offsets, dtype=np.int64))
+
+
+class TextColumn:
+    def __init__(self, directory, name):
+        data_path = os.path.join(directory, f"{name}.bin")
+        self._offsets = np.load(os.path.join(directory, f"{name}.idx.npy"), mmap_mode="r")
+        if os.path.getsize(data_path):
+            self._data = np.memmap(data_path, dtype=np.uint8, mode="r")
+        else:
+            self._data = np.empty(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return self._data[start:end].tobytes().decode("utf-8")
+
+
+class CatalogStore:
+    def __init__(self, directory):
+        self.ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode="r")
+        self._id_order = np.load(os.path.join(directory, "id_order.npy"), mmap_mode="r")
+        self.names = TextColumn(directory, "names")
+        self.texts = TextColumn(directory, "texts")
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def product_id(self, row):
+        return self.ids[row].decode("ascii")
+
+    def row_of(self, product_id):
+        key = np.bytes_(product_id.encode("ascii", "replace"))
+        position = int(np.searchsorted(self.ids, key, sorter=self._id_order))
+        if position < len(self._id_order):
+            row = int(self._id_order[position])
+            if self.ids[row] == key:
+                return row
+        return None
+
+    def product(self, row):
+        return {
+            "Uniq Id": self.product_id(row),
+            "Product Name": self.names[row],
+            "Combined Text": self.texts[row]
+        }
+
+    def embedding_rows(self, rows):
+        return np.asarray(self.embeddings[rows], dtype=np.float32)
+
+
+def write_ids(directory, ids):
+    ids = np.asarray([str(i) for i in ids], dtype=np.bytes_)
+    np.save(os.path.join(directory, "ids.npy"), ids)
+    np.save(os.path.join(directory, "id_order.npy"), np.argsort(ids, kind="stable"))
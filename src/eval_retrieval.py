@@ -0,0 +1,199 @@
+import argparse
+import json
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+import ann_index
+import artifact_store
+import attributes
+import reranker
+from catalog import EMBED_MODEL_NAME, encode_texts, fetch_catalog
+from ingest import build_artifacts
+from lexical_index import reciprocal_rank_fusion
+from live_catalog import CatalogSnapshot
+
+load_dotenv()
+
+# Retrieval quality and per-stage latency on the served artifacts. For each query it
+# times encoding, dense search, BM25 search, rank fusion, attribute filtering and
+# re-ranking, then reports top-1 accuracy (and whether the target was among the
+# candidates at all) for:
+#   dense, dense + rerank, hybrid (RRF), hybrid + rerank, filtered (hybrid with the
+#   colour / size / price filters parsed from the query) + rerank
+# Without --queries, queries are made from sampled catalog products the way users
+# write shopping lists: the first few words of the name plus any size or colour,
+# e.g. "horlicks health nutrition drink 1kg". A labelled file has one JSON object
+# per line: {"query": "...", "product_id": "..."}
+# FILTER_CASES are checked first: phrases whose parsed filters are known, including
+# ordinary product names that must not turn into a hard filter.
+#   python eval_retrieval.py --num-queries 300 --candidates 20
+
+# phrase -> filters parse_filters should give
+FILTER_CASES = [
+    ("iphone 15 pro max 256gb", {"sizes": {("gb", 256.0)}}),
+    ("3 in 1 shampoo", {}),
+    ("2 in 1 laptop", {}),
+    ("shoes under 500", {}),
+    ("3in speaker", {"sizes": {("mm", 76.2)}}),
+    ("blue nail paint under $20", {"colours": {"blue"}, "max_price": 20.0}),
+    ("shoes under 500 rs", {"max_price": 500.0}),
+    ("max price 50 toy", {"max_price": 50.0}),
+    ("watch above rs. 1000", {"min_price": 1000.0}),
+    ("1kg horlicks pack", {"sizes": {("g", 1000.0)}}),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Top-1 accuracy and stage latency of the retrieval pipeline")
+    parser.add_argument("--catalog", default=None, help="Local parquet file (defaults to the HF dataset)")
+    parser.add_argument("--queries", default=None, help="JSONL file with query / product_id pairs")
+    parser.add_argument("--num-queries", type=int, default=300)
+    parser.add_argument("--words", type=int, default=4, help="Name words kept in generated queries")
+    parser.add_argument("--candidates", type=int, default=20, help="First-stage candidates per query")
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def load_snapshot(catalog_path, embed_model, config):
+    key = artifact_store.make_key(artifact_store.file_digest(catalog_path), EMBED_MODEL_NAME,
+                                  ann_index.describe(config))
+    artifacts = artifact_store.load(artifact_store.resolve(key))
+    if artifacts is None:
+        print("No artifacts found for this configuration, building them (same as build_index.py)")
+        build_artifacts(catalog_path, key, embed_model, config, manifest={"model": EMBED_MODEL_NAME})
+        artifacts = artifact_store.load(key)
+    ann_index.set_search_params(artifacts["index"], config["nprobe"], config["ef_search"])
+    return CatalogSnapshot(artifacts)
+
+
+def generated_queries(snapshot, count, words, seed):
+    rows = np.random.default_rng(seed).choice(len(snapshot), min(count, len(snapshot)), replace=False)
+    queries = []
+    for row in rows:
+        name = snapshot.name(int(row))
+        extras = [f"{value:g}{'' if dimension == 'count' else dimension}"
+                  for dimension, value in sorted(attributes.sizes(name))]
+        extras += sorted(attributes.colours(name))
+        query = " ".join(name.lower().split()[:words] + extras)
+        queries.append((query, snapshot.product_id(int(row))))
+    return queries
+
+
+def file_queries(path):
+    with open(path) as f:
+        return [(item["query"], item["product_id"]) for item in map(json.loads, f) if item]
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return np.percentile(values, 50), np.percentile(values, 99)
+
+
+def check_filters():
+    failed = 0
+    for phrase, expected in FILTER_CASES:
+        got = attributes.parse_filters(phrase)
+        if got != expected:
+            failed += 1
+            print(f"filter FAIL {phrase!r}: got {got}, expected {expected}")
+    print(f"parse_filters: {len(FILTER_CASES) - failed}/{len(FILTER_CASES)} phrases as expected")
+
+
+def main():
+    args = parse_args()
+    check_filters()
+    catalog_path = args.catalog or fetch_catalog()
+    embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+    snapshot = load_snapshot(catalog_path, embed_model, ann_index.config_from_env())
+
+    if args.queries:
+        queries = file_queries(args.queries)
+    else:
+        queries = generated_queries(snapshot, args.num_queries, args.words, args.seed)
+
+    def correct(row, target):
+        # Same product, or a duplicate listing with the identical name
+        if row is None:
+            return False
+        target_row = snapshot.row_of(target)
+        return row == target_row or (target_row is not None and snapshot.name(row) == snapshot.name(target_row))
+
+    stages = {name: [] for name in ("encode", "dense", "lexical", "fusion", "filter", "filtered search", "rerank")}
+    modes = ("dense", "hybrid", "filtered")
+    hits = {f"{mode}{suffix}": 0 for mode in modes for suffix in ("", " + rerank")}
+    recall = {mode: 0 for mode in modes}
+    exact_name_hits = exact_name_correct = filtered_queries = 0
+
+    for phrase, target in queries:
+        exact = snapshot.exact_name(phrase)
+        if exact is not None:
+            exact_name_hits += 1
+            exact_name_correct += correct(exact, target)
+
+        start = time.perf_counter()
+        embedding = encode_texts(embed_model, [phrase])
+        stages["encode"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        dense_scores, dense_rows = snapshot.search(embedding, args.candidates)
+        stages["dense"].append(time.perf_counter() - start)
+        valid = dense_rows[0] >= 0
+        dense = (dense_rows[0][valid].tolist(), dense_scores[0][valid].tolist())
+
+        start = time.perf_counter()
+        lexical_rows, _ = snapshot.lexical_search(phrase, args.candidates)
+        stages["lexical"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        fused_rows, fused_scores = reciprocal_rank_fusion([dense[0], lexical_rows], args.rrf_k)
+        stages["fusion"].append(time.perf_counter() - start)
+        hybrid = (fused_rows[:args.candidates], fused_scores[:args.candidates])
+
+        start = time.perf_counter()
+        allowed = snapshot.allowed(attributes.parse_filters(phrase))
+        if allowed is not None and not allowed.any():
+            allowed = None
+        stages["filter"].append(time.perf_counter() - start)
+        filtered = hybrid
+        if allowed is not None:
+            filtered_queries += 1
+            start = time.perf_counter()
+            filtered = snapshot.hybrid_search(embedding, [phrase], args.candidates, args.candidates,
+                                              args.rrf_k, [allowed])[0]
+            stages["filtered search"].append(time.perf_counter() - start)
+
+        target_row = snapshot.row_of(target)
+        for mode, (rows, scores) in (("dense", dense), ("hybrid", hybrid), ("filtered", filtered)):
+            hits[mode] += correct(rows[0] if rows else None, target)
+            recall[mode] += target_row in rows
+
+            start = time.perf_counter()
+            ranked = reranker.rerank(phrase, [snapshot.product(row) for row in rows], scores)
+            stages["rerank"].append(time.perf_counter() - start)
+            best = snapshot.row_of(ranked[0]["Uniq Id"]) if ranked else None
+            hits[f"{mode} + rerank"] += correct(best, target)
+
+    total = len(queries)
+    print(f"{total} queries, {args.candidates} candidates, catalog of {len(snapshot)} products")
+    print(f"{'mode':<24}{'top-1':>8}{'in candidates':>15}")
+    for mode, count in hits.items():
+        in_candidates = recall[mode.split(" ")[0]] / total
+        print(f"{mode:<24}{count / total:>8.3f}{in_candidates:>15.3f}")
+    print(f"exact-name shortcut: {exact_name_hits / total:.1%} of queries, "
+          f"{exact_name_correct / max(exact_name_hits, 1):.1%} correct")
+    print(f"attribute filters applied to {filtered_queries / total:.1%} of queries")
+
+    print(f"{'stage':<16}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, timings in stages.items():
+        if not timings:
+            continue
+        p50, p99 = percentiles(timings)
+        print(f"{name:<16}{p50:>9.3f}{p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import random
+import time
+
+from llm_client import AsyncLLMClient
+
+# Local stand-in for genai.GenerativeModel: same generate_content /
+# generate_content_async interface, configurable latency and failure rate, no
+# network or API key. main.py uses it with canned_response when FAKE_LLM is set.
+# Running this file compares sequential calls against the AsyncLLMClient fan-out:
+#   python fake_llm.py --items 10 --latency 0.8 --concurrency 8
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def canned_response(prompt):
+    # Plausible replies for each prompt main.py sends, enough to drive the full pipeline
+    if isinstance(prompt, list):
+        if "Identify the user's intent" in prompt[-1]:
+            return ('{"transcript": "I want milk, bread and a toothpaste", "intent": "add the products", '
+                    '"products": ["milk", "bread", "toothpaste"]}')
+        return "I want milk, bread and a toothpaste"
+    if "Identify the user's intent" in prompt:
+        return '{"intent": "add the products", "products": ["milk", "bread", "toothpaste"]}'
+    return "This product matches the request."
+
+
+class FakeGenerativeModel:
+    def __init__(self, latency=0.8, jitter=0.2, failure_rate=0.0, respond=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.respond = respond or (lambda prompt: f"Fake response to: {str(prompt)[-80:].strip()}")
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _delay(self):
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _result(self, prompt):
+        self.calls += 1
+        if self._random.random() < self.failure_rate:
+            raise ConnectionError("Fake LLM transient failure")
+        return FakeResponse(self.respond(prompt))
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self._delay())
+        return self._result(prompt)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(self._delay())
+        return self._result(prompt)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sequential vs. concurrent LLM calls against a fake model")
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    prompts = [f"Summarize product {i}" for i in range(args.items)]
+
+    model = FakeGenerativeModel(args.latency, failure_rate=0.0, seed=0)
+    start = time.perf_counter()
+    for prompt in prompts:
+        model.generate_content(prompt)
+    sequential = time.perf_counter() - start
+
+    model = FakeGenerativeModel(args.latency, failure_rate=args.failure_rate, seed=0)
+    client = AsyncLLMClient(model, max_concurrency=args.concurrency, timeout=args.timeout, backoff=0.1)
+    start = time.perf_counter()
+    asyncio.run(client.generate_many(prompts))
+    concurrent = time.perf_counter() - start
+
+    print(f"{args.items} calls at ~{args.latency:.2f}s each")
+    print(f"sequential: {sequential:.2f}s")
+    print(f"concurrent: {concurrent:.2f}s (concurrency {args.concurrency}, "
+          f"failure rate {args.failure_rate:.0%}) {client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import threading
+
+# In-process stand-in for the subset of redis-py that RedisCartRepository uses
+# (hash commands and pipelines). Values come back as bytes, like a real client
+# without decode_responses. Select it with CART_BACKEND=memory.
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return str(value).encode("utf-8")
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        # Like MULTI/EXEC: the queued commands run back to back under the client lock
+        with self._client._lock:
+            results = [command(*args, **kwargs) for command, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._commands = []
+
+
+class FakeRedis:
+    def __init__(self):
+        self._hashes = {}
+        self._lock = threading.RLock()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self._lock:
+            fields = self._hashes.setdefault(_to_bytes(name), {})
+            updates = dict(mapping or {})
+            if key is not None:
+                updates[key] = value
+            created = 0
+            for k, v in updates.items():
+                created += _to_bytes(k) not in fields
+                fields[_to_bytes(k)] = _to_bytes(v)
+            return created
+
+    def hsetnx(self, name, key, value):
+        with self._lock:
+            fields = self._hashes.setdefault(_to_bytes(name), {})
+            if _to_bytes(key) in fields:
+                return 0
+            fields[_to_bytes(key)] = _to_bytes(value)
+            return 1
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            fields = self._hashes.setdefault(_to_bytes(name), {})
+            value = int(fields.get(_to_bytes(key), b"0")) + amount
+            fields[_to_bytes(key)] = _to_bytes(value)
+            return value
+
+    def hget(self, name, key):
+        with self._lock:
+            return self._hashes.get(_to_bytes(name), {}).get(_to_bytes(key))
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(_to_bytes(name), {}))
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            fields = self._hashes.get(_to_bytes(name), {})
+            removed = 0
+            for key in keys:
+                removed += fields.pop(_to_bytes(key), None) is not None
+            if not fields:
+                self._hashes.pop(_to_bytes(name), None)
+            return removed
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._hashes.pop(_to_bytes(name), None) is not None for name in names)
+
+    def close(self):
+        pass
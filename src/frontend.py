@@ -4,21 +4,36 @@ import requests
 import os
 from werkzeug.utils import secure_filename
 
+from media_preprocess import (AUDIO_BITRATE, AUDIO_SAMPLE_RATE, EXTENSIONS, IMAGE_MAX_SIDE, IMAGE_QUALITY,
+                              preprocess_audio, preprocess_image)
+
 app = Flask(__name__)
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'mp3', 'wav', 'ogg'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Ensure upload folder exists
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Uploads are streamed to the API without being saved here; larger requests get a 413
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+# Photos and voice notes are shrunk in the browser (preprocessUpload in the page below)
+# before they are uploaded. Uploads that arrive without the 'preprocessed' flag (old
+# browser, decode error) are shrunk here instead, with media_preprocess.py
+MEDIA_PREPROCESS = os.getenv('MEDIA_PREPROCESS', '1') != '0'
+# "32k" -> 32000 bits per second for the browser's encoder
+AUDIO_BITS = int(float(AUDIO_BITRATE.rstrip('kK')) * (1000 if AUDIO_BITRATE[-1] in 'kK' else 1))
 
 # Helper function to check allowed file extensions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Multipart file tuple for the API: preprocessed bytes, or the upload's stream as is
+def upload_part(file, preprocess):
+    filename = secure_filename(file.filename)
+    if not MEDIA_PREPROCESS or request.form.get('preprocessed') == '1':
+        return (filename, file.stream, file.mimetype)
+    data, mime_type = preprocess(file.read())
+    if mime_type is None:
+        return (filename, data, file.mimetype)
+    return (os.path.splitext(filename)[0] + EXTENSIONS[mime_type], data, mime_type)
+
 # Generate unique user ID based on username
 def get_user_id(username):
     return str(uuid.uuid5(uuid.NAMESPACE_DNS, username))
@@ -387,6 +402,197 @@ def index():
                 }
             }
 
+            // Photos and voice notes are shrunk here, before they leave the phone, since
+            // the upload is most of the wait on a mobile network (same settings as
+            // media_preprocess.py, which the server still runs if this fails):
+            //   images - greyscale, longest side at most IMAGE_MAX_SIDE, JPEG
+            //   audio  - mono, AUDIO_SAMPLE_RATE Hz, silence trimmed, Opus in Ogg
+            //            (16-bit WAV where the browser has no AudioEncoder)
+            const IMAGE_MAX_SIDE = {{ image_max_side }};
+            const IMAGE_QUALITY = {{ image_quality }};
+            const AUDIO_SAMPLE_RATE = {{ audio_sample_rate }};
+            const AUDIO_BITRATE = {{ audio_bitrate }};
+            // Silence is anything this many dB below the clip's average loudness
+            const SILENCE_MARGIN_DB = 12;
+            const SILENCE_PADDING_MS = 200;
+
+            function renamed(file, extension) {
+                const dot = file.name.lastIndexOf('.');
+                return (dot > 0 ? file.name.slice(0, dot) : file.name) + extension;
+            }
+
+            async function shrinkImage(file) {
+                const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+                const scale = Math.min(1, IMAGE_MAX_SIDE / Math.max(bitmap.width, bitmap.height));
+                const canvas = document.createElement('canvas');
+                canvas.width = Math.round(bitmap.width * scale);
+                canvas.height = Math.round(bitmap.height * scale);
+                const context = canvas.getContext('2d');
+                context.imageSmoothingQuality = 'high';
+                context.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+                bitmap.close();
+
+                const pixels = context.getImageData(0, 0, canvas.width, canvas.height);
+                const rgba = pixels.data;
+                for (let i = 0; i < rgba.length; i += 4) {
+                    const grey = 0.299 * rgba[i] + 0.587 * rgba[i + 1] + 0.114 * rgba[i + 2];
+                    rgba[i] = rgba[i + 1] = rgba[i + 2] = grey;
+                }
+                context.putImageData(pixels, 0, 0);
+
+                const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', IMAGE_QUALITY));
+                if (!blob || blob.size >= file.size) return file;
+                return new File([blob], renamed(file, '.jpg'), { type: 'image/jpeg' });
+            }
+
+            function trimSilence(samples) {
+                const frame = AUDIO_SAMPLE_RATE / 100;
+                const energies = [];
+                let total = 0;
+                for (let start = 0; start < samples.length; start += frame) {
+                    let sum = 0;
+                    const end = Math.min(samples.length, start + frame);
+                    for (let i = start; i < end; i++) sum += samples[i] * samples[i];
+                    energies.push(sum / (end - start));
+                    total += sum;
+                }
+                const threshold = (total / samples.length) * Math.pow(10, -SILENCE_MARGIN_DB / 10);
+                const first = energies.findIndex(energy => energy > threshold);
+                if (first < 0) return samples;
+                let last = energies.length - 1;
+                while (energies[last] <= threshold) last--;
+                const padding = SILENCE_PADDING_MS * AUDIO_SAMPLE_RATE / 1000;
+                return samples.subarray(Math.max(0, first * frame - padding),
+                                        Math.min(samples.length, (last + 1) * frame + padding));
+            }
+
+            function encodeWav(samples) {
+                const view = new DataView(new ArrayBuffer(44 + samples.length * 2));
+                const text = (offset, value) => [...value].forEach((c, i) => view.setUint8(offset + i, c.charCodeAt(0)));
+                text(0, 'RIFF'); view.setUint32(4, 36 + samples.length * 2, true); text(8, 'WAVE');
+                text(12, 'fmt '); view.setUint32(16, 16, true); view.setUint16(20, 1, true); view.setUint16(22, 1, true);
+                view.setUint32(24, AUDIO_SAMPLE_RATE, true); view.setUint32(28, AUDIO_SAMPLE_RATE * 2, true);
+                view.setUint16(32, 2, true); view.setUint16(34, 16, true);
+                text(36, 'data'); view.setUint32(40, samples.length * 2, true);
+                samples.forEach((s, i) => view.setInt16(44 + i * 2, Math.max(-1, Math.min(1, s)) * 0x7fff, true));
+                return new Blob([view], { type: 'audio/wav' });
+            }
+
+            // Ogg pages (RFC 3533) around the Opus packets from WebCodecs (RFC 7845)
+            const OGG_CRC = Array.from({ length: 256 }, (_, n) => {
+                let r = n << 24;
+                for (let k = 0; k < 8; k++) r = r & 0x80000000 ? (r << 1) ^ 0x04c11db7 : r << 1;
+                return r >>> 0;
+            });
+
+            function oggPage(packets, granule, sequence, flags) {
+                const lacing = [];
+                packets.forEach(p => {
+                    for (let n = p.length; n >= 0; n -= 255) lacing.push(Math.min(n, 255));
+                });
+                const size = packets.reduce((sum, p) => sum + p.length, 0);
+                const page = new Uint8Array(27 + lacing.length + size);
+                const view = new DataView(page.buffer);
+                page.set([0x4f, 0x67, 0x67, 0x53, 0, flags]);
+                view.setUint32(6, granule % 0x100000000, true);
+                view.setUint32(10, Math.floor(granule / 0x100000000), true);
+                view.setUint32(14, 0x5347, true);
+                view.setUint32(18, sequence, true);
+                page[26] = lacing.length;
+                page.set(lacing, 27);
+                let offset = 27 + lacing.length;
+                packets.forEach(p => { page.set(p, offset); offset += p.length; });
+                let crc = 0;
+                page.forEach(b => { crc = ((crc << 8) ^ OGG_CRC[((crc >>> 24) ^ b) & 0xff]) >>> 0; });
+                view.setUint32(22, crc, true);
+                return page;
+            }
+
+            async function encodeOpus(samples) {
+                const config = { codec: 'opus', sampleRate: AUDIO_SAMPLE_RATE, numberOfChannels: 1, bitrate: AUDIO_BITRATE };
+                if (typeof AudioEncoder === 'undefined' || !(await AudioEncoder.isConfigSupported(config)).supported) return null;
+                const packets = [];
+                let failure = null;
+                const encoder = new AudioEncoder({
+                    output: chunk => {
+                        const data = new Uint8Array(chunk.byteLength);
+                        chunk.copyTo(data);
+                        packets.push([data, chunk.duration]);
+                    },
+                    error: e => { failure = e; }
+                });
+                encoder.configure(config);
+                encoder.encode(new AudioData({ format: 'f32', sampleRate: AUDIO_SAMPLE_RATE, numberOfChannels: 1,
+                                               numberOfFrames: samples.length, timestamp: 0, data: samples }));
+                await encoder.flush();
+                encoder.close();
+                if (failure) throw failure;
+
+                const head = new Uint8Array(19);
+                const headView = new DataView(head.buffer);
+                head.set([...'OpusHead'].map(c => c.charCodeAt(0)));
+                head[8] = 1; head[9] = 1;
+                headView.setUint16(10, 312, true);
+                headView.setUint32(12, AUDIO_SAMPLE_RATE, true);
+                const tags = new Uint8Array(16);
+                tags.set([...'OpusTags'].map(c => c.charCodeAt(0)));
+
+                const pages = [oggPage([head], 0, 0, 2), oggPage([tags], 0, 1, 0)];
+                let granule = 0, batch = [], segments = 0;
+                packets.forEach(([data, duration]) => {
+                    const lacing = Math.floor(data.length / 255) + 1;
+                    if (segments + lacing > 255) {
+                        pages.push(oggPage(batch, granule, pages.length, 0));
+                        batch = []; segments = 0;
+                    }
+                    batch.push(data);
+                    segments += lacing;
+                    // Granule positions count 48 kHz samples whatever the input rate
+                    granule += Math.round((duration || 20000) * 48 / 1000);
+                });
+                pages.push(oggPage(batch, granule, pages.length, 4));
+                return new Blob(pages, { type: 'audio/ogg' });
+            }
+
+            async function shrinkAudio(file) {
+                const context = new AudioContext();
+                let decoded;
+                try {
+                    decoded = await context.decodeAudioData(await file.arrayBuffer());
+                } finally {
+                    context.close();
+                }
+                // Rendering into a one-channel context at the target rate downmixes and resamples
+                const offline = new OfflineAudioContext(1, Math.ceil(decoded.duration * AUDIO_SAMPLE_RATE), AUDIO_SAMPLE_RATE);
+                const source = offline.createBufferSource();
+                source.buffer = decoded;
+                source.connect(offline.destination);
+                source.start();
+                const samples = trimSilence((await offline.startRendering()).getChannelData(0));
+
+                const opus = await encodeOpus(samples);
+                const blob = opus || encodeWav(samples);
+                if (blob.size >= file.size) return file;
+                return new File([blob], renamed(file, opus ? '.ogg' : '.wav'), { type: blob.type });
+            }
+
+            // Swaps the form's image / audio for the shrunk version and tells the server
+            // not to do it again; on any error the original goes up and the server shrinks it
+            async function preprocessUpload(formData) {
+                for (const [name, shrink] of [['image', shrinkImage], ['audio', shrinkAudio]]) {
+                    const file = formData.get(name);
+                    if (!(file instanceof File) || !file.size) continue;
+                    try {
+                        const shrunk = await shrink(file);
+                        formData.set(name, shrunk, shrunk.name);
+                        formData.set('preprocessed', '1');
+                        console.log(`${name}: ${file.size} -> ${shrunk.size} bytes`);
+                    } catch (error) {
+                        console.warn(`Could not preprocess ${name}, sending it as is:`, error);
+                    }
+                }
+            }
+
             function updateCartDisplay(cartData) {
                 const cartElement = document.getElementById('cart');
                 const cartCount = document.getElementById('cartCount');
@@ -458,6 +664,7 @@ def index():
                 button.disabled = true;
 
                 try {
+                    await preprocessUpload(formData);
                     const response = await fetch(endpoint, {
                         method: 'POST',
                         body: formData
@@ -549,7 +756,8 @@ def index():
         </script>
     </body>
     </html>
-    ''')
+    ''', image_max_side=IMAGE_MAX_SIDE, image_quality=IMAGE_QUALITY / 100,
+       audio_sample_rate=AUDIO_SAMPLE_RATE, audio_bitrate=AUDIO_BITS)
 
 # Global variable to store current username
 current_username = None
@@ -579,7 +787,9 @@ def process_text():
     try:
         response = requests.post('http://localhost:8000/process-text/', data={
             'username': username,
-            'user_query': user_query
+            'user_query': user_query,
+            'summary': 'lazy',  # only product names are shown, skip the Gemini summaries
+            'cart_view': 'summary'
         })
         response.raise_for_status()
         api_response = response.json()
@@ -609,24 +819,17 @@ def process_image():
         return jsonify({'error': 'No selected file'}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
         try:
-            with open(file_path, 'rb') as f:
-                response = requests.post('http://localhost:8000/process-image/', 
-                                      files={'image': f}, 
-                                      data={'username': username})
-                response.raise_for_status()
-                api_response = response.json()
-                cart_items = api_response.get("cart", {}).get("products", [])
-                product_list = [item.get("product_name") for item in cart_items]
-                return jsonify({'cart': product_list})
+            response = requests.post('http://localhost:8000/process-image/', 
+                                  files={'image': upload_part(file, preprocess_image)}, 
+                                  data={'username': username, 'summary': 'lazy', 'cart_view': 'summary'})
+            response.raise_for_status()
+            api_response = response.json()
+            cart_items = api_response.get("cart", {}).get("products", [])
+            product_list = [item.get("product_name") for item in cart_items]
+            return jsonify({'cart': product_list})
         except requests.RequestException as e:
             return jsonify({'error': f'API error: {str(e)}'}), 500
-        finally:
-            os.remove(file_path)
     return jsonify({'error': 'Invalid file type'}), 400
 
 @app.route('/process-voice/', methods=['POST'])
@@ -640,17 +843,12 @@ def process_voice():
         return jsonify({'error': 'Missing audio or username'}), 400
 
     if allowed_file(audio.filename):
-        filename = secure_filename(audio.filename)
-        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        audio.save(path)
-
         try:
-            with open(path, 'rb') as f:
-                response = requests.post(
-                    'http://localhost:8000/process-voice/',
-                    data={'username': username},
-                    files={'audio': f}
-                )
+            response = requests.post(
+                'http://localhost:8000/process-voice/',
+                data={'username': username, 'summary': 'lazy', 'cart_view': 'summary'},
+                files={'audio': upload_part(audio, preprocess_audio)}
+            )
             response.raise_for_status()
             api_response = response.json()
             cart_items = api_response.get("cart", {}).get("products", [])
@@ -658,8 +856,6 @@ def process_voice():
             return jsonify({'cart': product_list})
         except requests.RequestException as e:
             return jsonify({'error': f'API error: {str(e)}'}), 500
-        finally:
-            os.remove(path)
     return jsonify({'error': 'Invalid audio file type'}), 400
 
 if __name__ == '__main__':
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import ann_index
+import artifact_store
+from catalog import ATTRIBUTE_COLUMNS, TEXT_COLUMNS, combined_text, count_rows, encode_texts
+
+# Streaming catalog ingestion, shared by build_index.py and the API's cold start.
+# The parquet is read one row group at a time and cut into batches of batch_rows.
+# Each batch gets its combined text from Arrow compute, is encoded, and is then
+# written to the artifact store and the index before the next batch is touched.
+# The next batch is read from disk while the current one is being encoded. Peak
+# memory is a couple of batches plus the index, however large the catalog is.
+
+
+def iter_batches(path, batch_rows=8192):
+    parquet = pq.ParquetFile(path)
+    # Attribute columns are optional; a catalog without them just has no price / category
+    columns = TEXT_COLUMNS + [c for c in ATTRIBUTE_COLUMNS if c in parquet.schema_arrow.names]
+    for group in range(parquet.num_row_groups):
+        table = parquet.read_row_group(group, columns=columns)
+        yield from table.to_batches(max_chunksize=batch_rows)
+
+
+def prefetch(batches):
+    # One reader thread keeps the next batch ready; parquet decoding releases the GIL
+    with ThreadPoolExecutor(1, thread_name_prefix="ingest-read") as reader:
+        pending = reader.submit(next, batches, None)
+        while True:
+            batch = pending.result()
+            if batch is None:
+                return
+            pending = reader.submit(next, batches, None)
+            yield batch
+
+
+def attribute_column(batch, name):
+    if name not in batch.schema.names:
+        return None
+    return pc.cast(batch.column(name), pa.string()).to_pylist()
+
+
+class StreamingIndexWriter:
+    # Flat and HNSW indexes need no training, so each batch is added as soon as it
+    # is encoded. IVF indexes are trained on a sample once every row is on disk,
+    # then filled in chunks from the memory-mapped embeddings (ann_index.build_index).
+
+    def __init__(self, config, dim, num_rows):
+        self.config = config
+        self.index = None
+        if config["kind"] in ("flat", "hnsw"):
+            self.index = ann_index.create_index(dim, config, num_rows)
+
+    def add(self, embeddings):
+        if self.index is not None:
+            self.index.add(embeddings)
+
+    def finish(self, embeddings):
+        if self.index is None:
+            return ann_index.build_index(embeddings, self.config)
+        return ann_index.set_search_params(self.index, self.config["nprobe"], self.config["ef_search"])
+
+
+def build_artifacts(catalog_path, key, embed_model, index_config, batch_rows=8192, batch_size=256,
+                    pool=None, manifest=None, log=print, replace=False):
+    total_rows = count_rows(catalog_path)
+    dim = embed_model.get_sentence_embedding_dimension()
+    writer = StreamingIndexWriter(index_config, dim, total_rows)
+
+    with artifact_store.ArtifactBuilder(key, total_rows, dim) as builder:
+        done = 0
+        start = time.perf_counter()
+        for batch in prefetch(iter_batches(catalog_path, batch_rows)):
+            batch_start = time.perf_counter()
+            texts = combined_text(batch).to_pylist()
+            embeddings = encode_texts(embed_model, texts, batch_size, pool)
+            builder.add(batch.column("Uniq Id").to_pylist(), batch.column("Product Name").to_pylist(),
+                        texts, embeddings, *(attribute_column(batch, c) for c in ATTRIBUTE_COLUMNS))
+            writer.add(embeddings)
+            done += len(texts)
+
+            batch_rate = len(texts) / (time.perf_counter() - batch_start)
+            overall_rate = done / (time.perf_counter() - start)
+            log(f"{done}/{total_rows} rows | batch {batch_rate:.1f} rows/s | overall {overall_rate:.1f} rows/s")
+
+        elapsed = time.perf_counter() - start
+        index_start = time.perf_counter()
+        index = writer.finish(builder.embeddings)
+        log(f"Finished {ann_index.describe(index_config)} index in {time.perf_counter() - index_start:.1f}s")
+
+        info = {
+            "index": ann_index.describe(index_config),
+            "build_seconds": round(elapsed, 2),
+            "rows_per_second": round(done / elapsed, 1) if elapsed else None,
+        }
+        info.update(manifest or {})
+        return builder.commit(index, info, replace)
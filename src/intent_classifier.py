@@ -0,0 +1,167 @@
+import re
+
+import numpy as np
+
+from attributes import COLOUR_PATTERN
+from catalog import encode_texts
+from intents import ADD, INTENTS, REMOVE, SHOW
+
+# On-box intent + product extraction for the common, simple utterances, so they never
+# wait on Gemini. Two cheap signals are combined:
+#   rules      - verb patterns ("remove", "show my cart", "I need") and list shape
+#   prototypes - cosine similarity of the utterance to a handful of example
+#                commands per intent, embedded once with the catalog's MiniLM model
+# Products are the utterance's spans after dropping the command words, split on
+# commas, "and", newlines and the like. Every result has a confidence, and main.py
+# only trusts results at or above INTENT_CONFIDENCE; anything unusual (questions,
+# long sentences, several verbs) scores low and goes to Gemini as before.
+
+PROTOTYPES = {
+    ADD: [
+        "add milk and bread to my cart", "I want a toothpaste", "buy 2 packs of eggs",
+        "I need shampoo, soap and a towel", "put a blue nail paint in the cart", "get me some rice",
+        "order a 1kg horlicks pack", "milk, bread, butter",
+    ],
+    REMOVE: [
+        "remove the milk from my cart", "delete the toothpaste", "take out the bread",
+        "I don't want the shampoo anymore", "drop the eggs from the cart", "remove nail paint",
+        "cancel the rice", "get rid of the soap",
+    ],
+    SHOW: [
+        "show my cart", "what is in my cart", "show the products", "list my items",
+        "view cart", "what have I added so far", "display my basket", "show me everything in the cart",
+    ],
+}
+
+RULES = {
+    REMOVE: re.compile(r"\b(remove|delete|drop|take (?:out|off)|get rid of|don'?t (?:want|need)|"
+                       r"no longer (?:want|need)|cancel|discard)\b"),
+    SHOW: re.compile(r"\b(show|view|see|display|list|check|what'?s|what is|what have)\b.*"
+                     r"\b(cart|basket|bag|items|products|order|added)\b|^\s*(my )?(cart|basket)\s*\??\s*$"),
+    ADD: re.compile(r"\b(add|buy|need|want|get|order|put|purchase|include|grab|pick up)\b"),
+}
+# Edits that are neither a plain add nor a plain remove
+CHANGE = re.compile(r"\b(swap|replace|instead|change|exchange|switch)\b")
+# An add verb under a negation ("don't add milk", "do not buy eggs"); "don't want" is
+# already a remove rule and is taken out before this is checked
+NEGATED = re.compile(r"\b(?:don'?t|do not|dont|never|not|no need to|stop)\s+(?:\w+\s+){0,2}?"
+                     r"(?:add|buy|get|order|put|purchase|include|grab|pick up|want|need)\b")
+
+# Command words stripped from the start of each span, and politeness from the end
+LEADING = re.compile(
+    r"^\s*(?:hey|hi|ok|okay|please|kindly|can you|could you|would you|i'?d like to|i would like to|"
+    r"i want to|i wanna|i want|i need|i'?d like|i would like|want|need|add|buy|get rid of|get me|get|order|"
+    r"put|purchase|include|remove|delete|drop|take out|take off|cancel|discard|i don'?t want|i don'?t need|"
+    r"i no longer want|i no longer need|also|and|some|me)\b[\s,:]*", re.I)
+TRAILING = re.compile(r"\s*\b(?:anymore|any more|please|thanks|thank you)\b[\s.!]*$", re.I)
+# "to my cart" and the like, wherever it is: "add milk to my cart and eggs" is two items
+CART_PHRASE = re.compile(
+    r"\s*\b(?:to|in|into|from|out of|off)\s+(?:(?:my|the)\s+)?(?:shopping\s+)?(?:cart|basket|bag|list|order)\b", re.I)
+SEPARATORS = re.compile(r"\s*(?:,|;|\n|\+|&|\band\b|\bplus\b|\balso\b)\s*", re.I)
+ARTICLES = re.compile(r"^(?:a|an|the|some|my|few|a few|one|any)\s+", re.I)
+BULLETS = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+MAX_SPAN_WORDS = 8
+
+# Names with "and" in them that the separator split would cut in two; when one shows
+# up the split is not trusted and the utterance goes to Gemini
+COMPOUNDS = re.compile(
+    r"\b(?:mac|macaroni) (?:and|&) cheese|\bsalt (?:and|&) pepper|\bbread (?:and|&) butter|"
+    r"\bfish (?:and|&) chips|\bsweet (?:and|&) sour|\bpeanut butter (?:and|&) jelly|"
+    r"\bhead (?:and|&) shoulders|\bjohnson (?:and|&) johnson|\bbaby (?:and|&) me|\bblack (?:and|&) decker|"
+    r"\bpots (?:and|&) pans|\bnuts (?:and|&) bolts|\bpen (?:and|&) paper", re.I)
+# Two colours joined by "and" describe one item: "black and white shirt"
+COLOUR_PAIR = re.compile(COLOUR_PATTERN.pattern + r"\s+(?:and|&)\s+" + COLOUR_PATTERN.pattern, re.I)
+
+
+def splits_compound(text):
+    return bool(COMPOUNDS.search(text) or COLOUR_PAIR.search(text))
+
+
+class IntentResult:
+    def __init__(self, intent, products, confidence, source):
+        self.intent = intent
+        self.products = products
+        self.confidence = confidence
+        self.source = source
+
+    def as_dict(self):
+        return {"intent": self.intent, "products": self.products,
+                "confidence": round(self.confidence, 3), "source": self.source}
+
+
+def _strip_repeated(pattern, text):
+    # "please can you add" -> ""
+    previous = None
+    while previous != text:
+        previous = text
+        text = pattern.sub("", text)
+    return text
+
+
+def extract_products(text):
+    lines = [CART_PHRASE.sub(",", BULLETS.sub("", line)) for line in text.splitlines() or [text]]
+
+    products = []
+    for span in SEPARATORS.split("\n".join(lines)):
+        span = TRAILING.sub("", _strip_repeated(LEADING, span.strip()))
+        span = _strip_repeated(ARTICLES, span.strip(" .!?\"'"))
+        if span:
+            products.append(span)
+    return products
+
+
+class IntentClassifier:
+    def __init__(self, embed_model, prototypes=PROTOTYPES):
+        self.embed_model = embed_model
+        self.labels = []
+        texts = []
+        for intent, examples in prototypes.items():
+            self.labels += [intent] * len(examples)
+            texts += examples
+        self.labels = np.asarray(self.labels)
+        self.prototypes = encode_texts(embed_model, texts)
+
+    def prototype_scores(self, embedding):
+        # Best cosine similarity per intent
+        similarities = self.prototypes @ embedding
+        return {intent: float(similarities[self.labels == intent].max()) for intent in INTENTS}
+
+    def classify(self, text):
+        text = (text or "").strip()
+        if not text:
+            return IntentResult(None, [], 0.0, "local")
+        lowered = text.lower()
+
+        matched = [intent for intent in (REMOVE, SHOW) if RULES[intent].search(lowered)]
+        # "don't want" is not an add
+        without_remove = RULES[REMOVE].sub(" ", lowered)
+        if RULES[ADD].search(without_remove):
+            matched.append(ADD)
+        scores = self.prototype_scores(encode_texts(self.embed_model, [text])[0])
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        best, margin = ranked[0], scores[ranked[0]] - scores[ranked[1]]
+
+        if len(matched) == 1:
+            intent = matched[0]
+            # Rule and prototypes agree: trust it; otherwise only as far as the prototypes allow
+            confidence = 0.95 if best == intent else 0.8 - min(margin, 0.3)
+        elif not matched:
+            # No command verb: a bare list ("milk, eggs, 1kg rice") is an add
+            intent = best
+            confidence = 0.5 + min(margin, 0.3) if best != ADD else 0.85
+        else:
+            # Several verbs ("remove the milk and add eggs") need the LLM
+            intent = matched[0] if best not in matched else best
+            confidence = 0.4
+        if CHANGE.search(lowered) or NEGATED.search(without_remove):
+            confidence = min(confidence, 0.4)
+
+        products = [] if intent == SHOW else extract_products(text)
+        if intent != SHOW and not products:
+            confidence = min(confidence, 0.3)
+        if any(len(p.split()) > MAX_SPAN_WORDS for p in products) or "?" in text and intent != SHOW:
+            confidence = min(confidence, 0.5)
+        if intent != SHOW and splits_compound(text):
+            confidence = min(confidence, 0.5)
+        return IntentResult(intent, products, confidence, "local")
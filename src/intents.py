@@ -0,0 +1,214 @@
+import json
+import re
+from enum import Enum
+
+from llm_client import LLM_ERRORS, EmptyReplyError
+
+# Intent extraction prompt and reply parsing, shared by the API (main.py), the local
+# classifier (intent_classifier.py), bench_intent.py and replay_intents.py.
+# Gemini is asked for JSON constrained by RESPONSE_SCHEMA; parse_reply checks the
+# reply strictly (no eval) and raises ReplyError when it doesn't fit, so
+# extract_intent can re-ask with the error instead of the user retrying. An empty or
+# blocked reply is re-asked the same way; a call that still fails after the client's
+# retries gives up on the request like an unparsable reply.
+
+
+class Intent(str, Enum):
+    ADD = "add the products"
+    REMOVE = "remove the product"
+    SHOW = "show the products"
+
+
+ADD, REMOVE, SHOW = Intent.ADD, Intent.REMOVE, Intent.SHOW
+INTENTS = tuple(Intent)
+
+# Other spellings models come up with, lower-cased with "_"/"-" as spaces
+INTENT_ALIASES = {
+    "add": ADD, "add product": ADD, "add products": ADD, "add the product": ADD, "buy": ADD,
+    "remove": REMOVE, "remove product": REMOVE, "remove products": REMOVE, "remove the products": REMOVE,
+    "delete": REMOVE,
+    "show": SHOW, "show products": SHOW, "show the product": SHOW, "show cart": SHOW, "view cart": SHOW,
+}
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": [intent.value for intent in Intent]},
+        "products": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["intent", "products"],
+}
+# Passed to generate_content; Gemini then only emits JSON matching the schema
+GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+
+# Single-pass image / audio requests also return what was read or heard, so the
+# endpoints can still report the user's query
+MEDIA_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": dict(RESPONSE_SCHEMA["properties"], transcript={"type": "string"}),
+    "required": ["transcript", "intent", "products"],
+}
+MEDIA_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": MEDIA_RESPONSE_SCHEMA}
+MEDIA_SOURCES = {"image": "the text written in this image", "audio": "what is said in this audio"}
+
+FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class ReplyError(ValueError):
+    pass
+
+
+def get_prompt(user_input):
+    return f"""
+You are an assistant for a shopping app. Your task is to:
+1. Identify the user's intent from one of these: ["add the products", "remove the product", "show the products"]
+2. Extract and list the products mentioned in the query as a list of strings.
+
+Respond with a JSON object only, in this format:
+{{"intent": "<intent>", "products": ["<product1>", "<product2>", ..., "<productN>"]}}
+
+Example Input: "I want a toothpaste, a 1kg horlicks pack and a nail paint of blue color"
+Output:
+{{"intent": "add the products", "products": ["toothpaste", "1kg horlicks pack", "nail paint of blue color"]}}
+
+Now process the following input:
+{json.dumps(user_input)}
+"""
+
+
+def retry_note(reply, error):
+    # Appended to the prompt when re-asking after a reply that didn't parse
+    return f"""
+Your previous reply could not be used ({error}):
+{reply}
+
+Reply again with only the JSON object.
+"""
+
+
+def get_media_prompt(kind):
+    return f"""
+You are an assistant for a shopping app. The user's request is {MEDIA_SOURCES[kind]}. Your task is to:
+1. Transcribe the request exactly as written or spoken.
+2. Identify the user's intent from one of these: ["add the products", "remove the product", "show the products"]
+   A plain list of items means "add the products".
+3. Extract and list the products mentioned in the request as a list of strings.
+
+Respond with a JSON object only, in this format:
+{{"transcript": "<request>", "intent": "<intent>", "products": ["<product1>", "<product2>", ..., "<productN>"]}}
+
+Example request: "I want a toothpaste, a 1kg horlicks pack and a nail paint of blue color"
+Output:
+{{"transcript": "I want a toothpaste, a 1kg horlicks pack and a nail paint of blue color", "intent": "add the products", "products": ["toothpaste", "1kg horlicks pack", "nail paint of blue color"]}}
+"""
+
+
+def normalize_intent(value):
+    if not isinstance(value, str):
+        raise ReplyError(f"intent must be a string, got {type(value).__name__}")
+    key = " ".join(value.strip().strip("{}").lower().replace("_", " ").replace("-", " ").split())
+    try:
+        return Intent(key)
+    except ValueError:
+        pass
+    if key in INTENT_ALIASES:
+        return INTENT_ALIASES[key]
+    raise ReplyError(f"unknown intent {value!r}")
+
+
+def _load_reply(text):
+    text = FENCE.sub("", (text or "").strip())
+    if not text:
+        raise ReplyError("empty reply")
+    try:
+        reply = json.loads(text)
+    except ValueError as e:
+        raise ReplyError(f"not valid JSON: {e}") from None
+    if not isinstance(reply, dict):
+        raise ReplyError("reply must be a JSON object")
+    return reply
+
+
+def parse_reply(text, reply=None):
+    # (Intent, [product, ...]) from a JSON reply, or ReplyError
+    reply = reply if reply is not None else _load_reply(text)
+    if "intent" not in reply:
+        raise ReplyError("missing intent")
+    intent = normalize_intent(reply["intent"])
+
+    products = reply.get("products", [])
+    if products is None:
+        products = []
+    if not isinstance(products, list) or not all(isinstance(p, str) for p in products):
+        raise ReplyError("products must be a list of strings")
+    products = [" ".join(p.split()) for p in products if p.strip()]
+    if intent != SHOW and not products:
+        raise ReplyError(f"no products for intent {intent.value!r}")
+    return intent, products
+
+
+def parse_media_reply(text):
+    # (transcript, Intent, [product, ...]) from a single-pass reply, or ReplyError
+    reply = _load_reply(text)
+    transcript = reply.get("transcript")
+    if not isinstance(transcript, str) or not transcript.strip():
+        raise ReplyError("missing transcript")
+    return (transcript.strip(),) + parse_reply(text, reply)
+
+
+def _count(stats, name):
+    stats[name] = stats.get(name, 0) + 1
+
+
+async def _generate(llm_client, prompt, generation_config, stats):
+    # The reply text; "" for an empty or blocked reply (parsed, and so re-asked, like
+    # any other bad reply), None when the call failed for good
+    try:
+        return await llm_client.generate(prompt, generation_config=generation_config)
+    except EmptyReplyError:
+        _count(stats, "empty_replies")
+        return ""
+    except LLM_ERRORS:
+        _count(stats, "llm_errors")
+        return None
+
+
+async def extract_intent(llm_client, user_input, max_reasks=2, stats=None):
+    # Ask Gemini, re-asking up to max_reasks times when the reply doesn't parse.
+    # Returns (None, []) if every attempt fails.
+    stats = stats if stats is not None else {}
+    prompt = get_prompt(user_input)
+    for attempt in range(max_reasks + 1):
+        reply = await _generate(llm_client, prompt, GENERATION_CONFIG, stats)
+        if reply is None:
+            return None, []
+        try:
+            return parse_reply(reply)
+        except ReplyError as e:
+            _count(stats, "parse_failures")
+            if attempt == max_reasks:
+                _count(stats, "unparsed")
+                return None, []
+            _count(stats, "reasks")
+            prompt = get_prompt(user_input) + retry_note(reply, e)
+
+
+async def extract_intent_from_media(llm_client, part, kind, max_reasks=2, stats=None):
+    # One call for transcription and intent extraction together; part is the image or
+    # audio as the model takes it and kind is "image" or "audio".
+    # Returns (transcript, Intent, products), or (None, None, []) if every attempt fails.
+    stats = stats if stats is not None else {}
+    prompt = get_media_prompt(kind)
+    for attempt in range(max_reasks + 1):
+        reply = await _generate(llm_client, [part, prompt], MEDIA_GENERATION_CONFIG, stats)
+        if reply is None:
+            return None, None, []
+        try:
+            return parse_media_reply(reply)
+        except ReplyError as e:
+            _count(stats, "parse_failures")
+            if attempt == max_reasks:
+                _count(stats, "unparsed")
+                return None, None, []
+            _count(stats, "reasks")
+            prompt = get_media_prompt(kind) + retry_note(reply, e)
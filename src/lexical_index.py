@@ -0,0 +1,278 @@
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+# BM25 inverted index over product names and combined text. It sits next to the
+# vector index and catches what MiniLM blurs: brand names, sizes like "1kg" and
+# model numbers. Files in the artifact directory:
+#   lexical_vocab.npy                  - sorted ASCII terms, looked up with searchsorted
+#   lexical_{field}_offsets.npy        - CSR offsets into the postings, one per term (+1)
+#   lexical_{field}_rows.npy           - catalog rows for each term
+#   lexical_{field}_weights.npy        - precomputed BM25 impact of the term in that row
+#   name_keys.npy / name_key_order.npy - hashes of normalized product names, for the
+#                                        exact-name shortcut
+#   lexical_stats.json                 - row count and average field lengths
+# Since the impacts are precomputed, scoring a query is one gather and one bincount
+# over the posting lists of its terms. Everything is memory-mapped like the catalog.
+
+FIELDS = ("name", "text")
+FIELD_WEIGHTS = {"name": 2.0, "text": 1.0}
+K1 = 1.2
+B = 0.75
+
+TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+[a-z]*)?")
+# "1 kg" and "1kg" should be the same token
+UNIT = re.compile(r"(\d+(?:\.\d+)?)\s+(kg|g|gm|gms|mg|l|ltr|ml|oz|lb|lbs|mm|cm|m|inch|in|ft|gb|tb|mah|w|pcs|pack)\b")
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "for", "with", "in", "on", "to", "or", "by", "is", "it", "me", "my", "i",
+    "some", "please", "want", "need", "add", "remove", "show", "products", "product",
+}
+
+
+def tokenize(text, stopwords=STOPWORDS):
+    if text is None:
+        return []
+    tokens = TOKEN.findall(UNIT.sub(r"\1\2", str(text).lower()))
+    return [t for t in tokens if t not in stopwords] if stopwords else tokens
+
+
+def name_key(name):
+    # Normalized product name; stopwords are kept so "The Ordinary" stays itself
+    return " ".join(tokenize(name, stopwords=None))
+
+
+def _hash_key(key):
+    return np.frombuffer(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), dtype=np.uint64)[0]
+
+
+def idf(df, num_rows):
+    return math.log(1 + (num_rows - df + 0.5) / (df + 0.5))
+
+
+def impact(idf_value, tf, length, avg_length):
+    return idf_value * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / max(avg_length, 1e-9)))
+
+
+class LexicalIndexWriter:
+    # Builds the index during streaming ingestion without holding the postings: each
+    # batch's postings are spilled to a run file (lexical_spill/, removed on close)
+    # and only per-term document counts stay in memory. close() then fills the CSR
+    # arrays, opened as memory-mapped .npy files, one run at a time. Batches arrive
+    # in row order, so appending each run's postings per term keeps every posting
+    # list sorted by row. What stays in memory grows with the vocabulary and, at
+    # 8 bytes per product, with the name-key hashes (sorted at close for the
+    # exact-name shortcut); never with the postings.
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.vocab = {}
+        self.rows = 0
+        self._spill_dir = os.path.join(directory, "lexical_spill")
+        os.makedirs(self._spill_dir, exist_ok=True)
+        self._runs = 0
+        self._df = {field: np.zeros(0, np.int64) for field in FIELDS}
+        self._length_sums = {field: 0.0 for field in FIELDS}
+        self._name_keys = []
+
+    def _run_path(self, run, field):
+        return os.path.join(self._spill_dir, f"{run}_{field}.npz")
+
+    def add(self, names, texts):
+        names = list(names)
+        for field, values in (("name", names), ("text", texts)):
+            terms, rows, tfs, lengths = [], [], [], []
+            for offset, value in enumerate(values):
+                tokens = tokenize(value)
+                lengths.append(len(tokens))
+                for token, tf in Counter(tokens).items():
+                    terms.append(self.vocab.setdefault(token, len(self.vocab)))
+                    rows.append(self.rows + offset)
+                    tfs.append(tf)
+            terms = np.asarray(terms, np.int64)
+            lengths = np.asarray(lengths, np.float32)
+            np.savez(self._run_path(self._runs, field), terms=terms, rows=np.asarray(rows, np.int32),
+                     tfs=np.asarray(tfs, np.float32), lengths=lengths)
+
+            counts = np.bincount(terms, minlength=len(self.vocab))
+            df = self._df[field]
+            counts[:len(df)] += df
+            self._df[field] = counts
+            self._length_sums[field] += float(lengths.sum())
+        self._name_keys.extend(_hash_key(name_key(name)) for name in names)
+        self.rows += len(names)
+        self._runs += 1
+
+    def close(self):
+        vocab = sorted(self.vocab)
+        # Writer term ids -> position in the sorted vocabulary
+        remap = np.empty(len(vocab), dtype=np.int64)
+        for position, term in enumerate(vocab):
+            remap[self.vocab[term]] = position
+        np.save(os.path.join(self.directory, "lexical_vocab.npy"), np.asarray(vocab, dtype=np.bytes_))
+
+        stats = {"rows": self.rows, "avg_length": {}}
+        for field in FIELDS:
+            avg_length = self._length_sums[field] / self.rows if self.rows else 0.0
+            stats["avg_length"][field] = avg_length
+
+            df = np.zeros(len(vocab), dtype=np.int64)
+            df[remap[:len(self._df[field])]] = self._df[field]
+            offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+            np.cumsum(df, out=offsets[1:])
+            idfs = np.log1p((self.rows - df + 0.5) / (df + 0.5))
+
+            np.save(os.path.join(self.directory, f"lexical_{field}_offsets.npy"), offsets)
+            out_rows = np.lib.format.open_memmap(os.path.join(self.directory, f"lexical_{field}_rows.npy"),
+                                                 mode="w+", dtype=np.int32, shape=(int(offsets[-1]),))
+            out_weights = np.lib.format.open_memmap(os.path.join(self.directory, f"lexical_{field}_weights.npy"),
+                                                    mode="w+", dtype=np.float32, shape=(int(offsets[-1]),))
+            # Next free slot in each term's posting list
+            cursor = offsets[:-1].copy()
+            first_row = 0
+            for run in range(self._runs):
+                with np.load(self._run_path(run, field)) as part:
+                    terms, rows, tfs, lengths = part["terms"], part["rows"], part["tfs"], part["lengths"]
+                terms = remap[terms]
+                # Stable, so rows stay ascending within each term
+                order = np.argsort(terms, kind="stable")
+                terms, rows, tfs = terms[order], rows[order], tfs[order]
+                counts = np.bincount(terms, minlength=len(vocab))
+                group_start = np.repeat(np.cumsum(counts) - counts, counts)
+                positions = cursor[terms] + np.arange(len(terms)) - group_start
+                cursor += counts
+
+                norm = K1 * (1 - B + B * lengths[rows - first_row] / max(avg_length, 1e-9))
+                out_rows[positions] = rows
+                out_weights[positions] = (idfs[terms] * tfs * (K1 + 1) / (tfs + norm)).astype(np.float32)
+                first_row += len(lengths)
+                os.remove(self._run_path(run, field))
+            out_rows.flush()
+            out_weights.flush()
+            del out_rows, out_weights
+
+        os.rmdir(self._spill_dir)
+        name_keys = np.asarray(self._name_keys, dtype=np.uint64)
+        np.save(os.path.join(self.directory, "name_keys.npy"), name_keys)
+        np.save(os.path.join(self.directory, "name_key_order.npy"), np.argsort(name_keys, kind="stable"))
+        with open(os.path.join(self.directory, "lexical_stats.json"), "w") as f:
+            json.dump(stats, f)
+
+
+class LexicalIndex:
+    def __init__(self, directory):
+        self.vocab = np.load(os.path.join(directory, "lexical_vocab.npy"), mmap_mode="r")
+        self.postings = {}
+        for field in FIELDS:
+            self.postings[field] = tuple(
+                np.load(os.path.join(directory, f"lexical_{field}_{part}.npy"), mmap_mode="r")
+                for part in ("offsets", "rows", "weights")
+            )
+        self.name_keys = np.load(os.path.join(directory, "name_keys.npy"), mmap_mode="r")
+        self._name_key_order = np.load(os.path.join(directory, "name_key_order.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "lexical_stats.json")) as f:
+            stats = json.load(f)
+        self.rows = stats["rows"]
+        self.avg_length = stats["avg_length"]
+
+    def term_id(self, token):
+        key = np.bytes_(token.encode("ascii"))
+        position = int(np.searchsorted(self.vocab, key))
+        if position < len(self.vocab) and self.vocab[position] == key:
+            return position
+        return None
+
+    def df(self, field, token):
+        term = self.term_id(token)
+        if term is None:
+            return 0
+        offsets = self.postings[field][0]
+        return int(offsets[term + 1] - offsets[term])
+
+    def scores(self, tokens):
+        # (rows, scores) of every row that contains at least one of the tokens
+        all_rows, all_weights = [], []
+        for token in set(tokens):
+            term = self.term_id(token)
+            if term is None:
+                continue
+            for field in FIELDS:
+                offsets, rows, weights = self.postings[field]
+                start, end = offsets[term], offsets[term + 1]
+                if end > start:
+                    all_rows.append(rows[start:end])
+                    all_weights.append(weights[start:end] * FIELD_WEIGHTS[field])
+        if not all_rows:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        return rows.astype(np.int64), np.bincount(inverse, np.concatenate(all_weights)).astype(np.float32)
+
+    def name_rows(self, key):
+        # Rows whose normalized name hashes like key; callers confirm against the real name
+        target = _hash_key(key)
+        start = int(np.searchsorted(self.name_keys, target, side="left", sorter=self._name_key_order))
+        end = int(np.searchsorted(self.name_keys, target, side="right", sorter=self._name_key_order))
+        return [int(row) for row in self._name_key_order[start:end]]
+
+
+class DeltaLexicalIndex:
+    # Same scoring for products upserted since the base was built (see live_catalog.py).
+    # Impacts use the base corpus statistics so scores stay comparable. Immutable:
+    # with_docs returns a new index and only copies the posting lists it touches.
+
+    def __init__(self, base, postings=None, names=None):
+        self.base = base
+        self.postings = postings or {}
+        self.names = names or {}
+
+    def with_docs(self, rows, names, texts):
+        postings = dict(self.postings)
+        names_by_key = dict(self.names)
+        for row, name, text in zip(rows, names, texts):
+            weights = Counter()
+            for field, value in (("name", name), ("text", text)):
+                tokens = tokenize(value)
+                for token, tf in Counter(tokens).items():
+                    idf_value = idf(self.base.df(field, token), self.base.rows)
+                    weights[token] += FIELD_WEIGHTS[field] * impact(
+                        idf_value, tf, len(tokens), self.base.avg_length[field])
+            for token, weight in weights.items():
+                postings[token] = postings.get(token, ()) + ((row, weight),)
+            key = name_key(name)
+            names_by_key[key] = names_by_key.get(key, ()) + (row,)
+        return DeltaLexicalIndex(self.base, postings, names_by_key)
+
+    def scores(self, tokens):
+        totals = Counter()
+        for token in set(tokens):
+            for row, weight in self.postings.get(token, ()):
+                totals[row] += weight
+        rows = np.fromiter(totals.keys(), dtype=np.int64, count=len(totals))
+        return rows, np.fromiter(totals.values(), dtype=np.float32, count=len(totals))
+
+    def name_rows(self, key):
+        return list(self.names.get(key, ()))
+
+
+def top_k(rows, scores, k):
+    if len(rows) > k:
+        keep = np.argpartition(-scores, k)[:k]
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    # rankings: lists of rows, best first. A row's fused score is sum(1 / (k + rank))
+    # over the lists it appears in, so agreement between retrievers wins over a
+    # single high rank, and raw BM25 / cosine scores never need calibrating.
+    fused = Counter()
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[int(row)] += 1.0 / (k + rank + 1)
+    best = fused.most_common()
+    return [row for row, _ in best], [score for _, score in best]
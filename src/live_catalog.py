@@ -0,0 +1,439 @@
+import threading
+import time
+import uuid
+
+import faiss
+import numpy as np
+import pyarrow as pa
+
+import ann_index
+import artifact_store
+from catalog import TEXT_COLUMNS, combined_text, encode_texts
+from attributes import AttributeTable
+from lexical_index import DeltaLexicalIndex, name_key, reciprocal_rank_fusion, tokenize, top_k
+
+# Incremental catalog updates on top of the immutable artifact store.
+#
+# The catalog being served is a CatalogSnapshot, and snapshots are never modified:
+#   base   - the memory-mapped catalog, index, BM25 postings and attribute columns
+#            from artifact_store (rows 0..N-1)
+#   delta  - products added or changed since the base was built: rows N, N+1, ...
+#            are kept in memory and indexed in a small IndexIDMap2 whose ids are
+#            those row numbers, plus a DeltaLexicalIndex and their attributes
+#   dead   - tombstones, one flag per row. A deleted product, or a row replaced by
+#            a newer version, is marked dead and excluded from every search with
+#            an IDSelectorBitmap instead of being removed from the index
+# An upsert embeds only the products it receives, builds the next snapshot off to
+# the side and then swaps the reference. A request that is already searching keeps
+# the snapshot it started with, so it never sees a half-applied update.
+#
+# Once the delta and tombstones get large (compact_rows, CATALOG_COMPACT_ROWS in
+# main.py), or every compact_seconds (CATALOG_COMPACT_SECONDS) while there are any
+# pending changes, a background thread rewrites the live rows into a new artifact
+# directory. It reuses the stored embeddings, so nothing is re-encoded. It then
+# rebuilds the index, replays any updates that arrived in the meantime, and swaps
+# the new snapshot in. The artifact_store pointer is moved as well, so a restart
+# serves the compacted catalog.
+#
+# With several workers, one of them is the writer (artifact_store.acquire_writer):
+# it alone takes upserts, deletes and compactions, and only it moves the pointer.
+# The other workers answer updates with ReadOnlyCatalog and poll the pointer every
+# reload_seconds (CATALOG_RELOAD_SECONDS in main.py); when it moves they load the
+# compacted snapshot and swap it in. They see an update once it has been compacted,
+# so within about compact_seconds + reload_seconds. If the writer dies, the next
+# worker to poll takes the lock over; upserts it had not compacted yet are lost, as
+# they were before on a restart.
+#
+# The writer deletes superseded compactions grace_seconds (CATALOG_GRACE_SECONDS)
+# after the pointer moved, so disk use stays at the original build plus the current
+# compaction. The original build is kept.
+
+
+class ReadOnlyCatalog(RuntimeError):
+    pass
+
+
+class Delta:
+    # Products upserted since the base was built, in row order (rows N, N+1, ...)
+
+    def __init__(self, ids, names, texts, embeddings, index, lexical, attributes, rows):
+        self.ids = ids
+        self.names = names
+        self.texts = texts
+        self.embeddings = embeddings
+        self.index = index
+        self.lexical = lexical
+        self.attributes = attributes
+        self.rows = rows
+
+    @classmethod
+    def empty(cls, dim, lexical):
+        return cls([], [], [], np.empty((0, dim), np.float32), faiss.IndexIDMap2(faiss.IndexFlatIP(dim)),
+                   DeltaLexicalIndex(lexical), AttributeTable.empty(), {})
+
+
+class CatalogSnapshot:
+    def __init__(self, base, delta=None, dead=None):
+        # base: artifact_store.load() output (catalog, index, lexical, attributes)
+        self.base = base
+        self.store = base["catalog"]
+        self.index = base["index"]
+        self.lexical = base["lexical"]
+        self.attributes = base["attributes"]
+        self.base_rows = len(self.store)
+        self.delta = delta if delta is not None else Delta.empty(self.store.embeddings.shape[1], self.lexical)
+        self.dead = dead if dead is not None else np.zeros(self.base_rows, dtype=bool)
+
+        # Rows a search may return; the bitmap must stay referenced as long as the selector
+        self._params = None
+        if self.dead.any():
+            self._params = self._search_params(~self.dead)
+
+    def _search_params(self, allowed):
+        bitmap = np.packbits(allowed, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+        return (ann_index.search_parameters(self.index, selector),
+                ann_index.search_parameters(self.delta.index, selector), selector, bitmap)
+
+    def __len__(self):
+        return len(self.dead) - int(self.dead.sum())
+
+    def row_of(self, product_id):
+        row = self.delta.rows.get(product_id)
+        if row is None:
+            row = self.store.row_of(product_id)
+        if row is None or self.dead[row]:
+            return None
+        return row
+
+    def product_id(self, row):
+        if row < self.base_rows:
+            return self.store.product_id(row)
+        return self.delta.ids[row - self.base_rows]
+
+    def name(self, row):
+        if row < self.base_rows:
+            return self.store.names[row]
+        return self.delta.names[row - self.base_rows]
+
+    def product(self, row):
+        if row < self.base_rows:
+            return self.store.product(row)
+        i = row - self.base_rows
+        return {"Uniq Id": self.delta.ids[i], "Product Name": self.delta.names[i], "Combined Text": self.delta.texts[i]}
+
+    def attribute_values(self, row):
+        # (category, price) as they were ingested
+        if row < self.base_rows:
+            return self.attributes.row(row)
+        return self.delta.attributes.row(row - self.base_rows)
+
+    def embedding_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        embeddings = np.empty((len(rows), self.delta.embeddings.shape[1]), dtype=np.float32)
+        base = rows < self.base_rows
+        embeddings[base] = self.store.embedding_rows(rows[base])
+        embeddings[~base] = self.delta.embeddings[rows[~base] - self.base_rows]
+        return embeddings
+
+    def allowed(self, filters):
+        # Live rows passing the attribute filters (see attributes.py), or None for no filters
+        if not filters:
+            return None
+        return np.concatenate([self.attributes.mask(filters), self.delta.attributes.mask(filters)]) & ~self.dead
+
+    def search(self, queries, k, allowed=None):
+        # Same contract as index.search: (scores, rows), best first, -1 where nothing matched.
+        # With allowed (a row mask), FAISS only visits rows that pass it.
+        params = self._params if allowed is None else self._search_params(allowed)
+        if params is None:
+            scores, rows = self.index.search(queries, k)
+        else:
+            scores, rows = self.index.search(queries, k, params=params[0])
+        if self.delta.index.ntotal == 0:
+            return scores, rows
+
+        if params is None:
+            delta_scores, delta_rows = self.delta.index.search(queries, k)
+        else:
+            delta_scores, delta_rows = self.delta.index.search(queries, k, params=params[1])
+        scores = np.concatenate([scores, delta_scores], axis=1)
+        rows = np.concatenate([rows, delta_rows], axis=1)
+        scores[rows < 0] = -np.inf
+        best = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, best, axis=1), np.take_along_axis(rows, best, axis=1)
+
+    def search_each(self, queries, k, allowed=None):
+        # Per-query row masks: unfiltered queries share one batched search, filtered ones run alone
+        if allowed is None or all(a is None for a in allowed):
+            return self.search(queries, k)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        plain = [i for i, a in enumerate(allowed) if a is None]
+        if plain:
+            scores[plain], rows[plain] = self.search(queries[plain], k)
+        for i, a in enumerate(allowed):
+            if a is not None:
+                scores[i], rows[i] = self.search(queries[i:i + 1], k, a)
+        return scores, rows
+
+    def lexical_search(self, phrase, k, allowed=None):
+        # BM25 over names and texts; (rows, scores) best first, dead rows never ranked
+        tokens = tokenize(phrase)
+        base_rows, base_scores = self.lexical.scores(tokens)
+        delta_rows, delta_scores = self.delta.lexical.scores(tokens)
+        rows = np.concatenate([base_rows, delta_rows])
+        scores = np.concatenate([base_scores, delta_scores])
+        keep = ~self.dead[rows] if allowed is None else allowed[rows]
+        return top_k(rows[keep], scores[keep], k)
+
+    def exact_name(self, phrase):
+        # Row of a live product whose normalized name is exactly the phrase, if any
+        key = name_key(phrase)
+        if not key:
+            return None
+        for row in self.delta.lexical.name_rows(key) + self.lexical.name_rows(key):
+            if not self.dead[row] and name_key(self.name(row)) == key:
+                return row
+        return None
+
+    def hybrid_search(self, query_embeddings, phrases, k=1, candidates=50, rrf_k=60, allowed=None):
+        # Dense and BM25 candidates merged with reciprocal rank fusion; one
+        # (rows, scores) pair per query, best first
+        allowed = allowed or [None] * len(phrases)
+        _, dense_rows = self.search_each(query_embeddings, candidates, allowed)
+        results = []
+        for dense, phrase, mask in zip(dense_rows, phrases, allowed):
+            lexical_rows, _ = self.lexical_search(phrase, candidates, mask)
+            rows, scores = reciprocal_rank_fusion([dense[dense >= 0], lexical_rows], rrf_k)
+            results.append((rows[:k], scores[:k]))
+        return results
+
+    def with_upserts(self, ids, names, texts, embeddings, categories=None, prices=None):
+        start = len(self.dead)
+        dead = np.concatenate([self.dead, np.zeros(len(ids), dtype=bool)])
+        delta_rows = dict(self.delta.rows)
+        for offset, product_id in enumerate(ids):
+            # Whatever row held this product before (base, delta, or earlier in this batch) is replaced
+            old = delta_rows.get(product_id)
+            if old is None:
+                old = self.store.row_of(product_id)
+            if old is not None:
+                dead[old] = True
+            delta_rows[product_id] = start + offset
+
+        new_rows = np.arange(start, start + len(ids), dtype=np.int64)
+        delta_index = faiss.clone_index(self.delta.index)
+        delta_index.add_with_ids(embeddings, new_rows)
+        delta = Delta(
+            self.delta.ids + list(ids), self.delta.names + list(names), self.delta.texts + list(texts),
+            np.concatenate([self.delta.embeddings, embeddings]), delta_index,
+            self.delta.lexical.with_docs(new_rows.tolist(), names, texts),
+            self.delta.attributes.concat(AttributeTable.extract(names, texts, categories, prices)), delta_rows
+        )
+        return CatalogSnapshot(self.base, delta, dead)
+
+    def with_deletes(self, ids):
+        dead = self.dead.copy()
+        delta_rows = dict(self.delta.rows)
+        for product_id in ids:
+            row = delta_rows.pop(product_id, None)
+            if row is None:
+                row = self.store.row_of(product_id)
+            if row is not None:
+                dead[row] = True
+        d = self.delta
+        delta = Delta(d.ids, d.names, d.texts, d.embeddings, d.index, d.lexical, d.attributes, delta_rows)
+        return CatalogSnapshot(self.base, delta, dead)
+
+    def pending_changes(self):
+        # Rows a compaction would get rid of: the in-memory delta plus tombstoned base rows
+        return len(self.delta.ids) + int(self.dead[:self.base_rows].sum())
+
+
+class LiveCatalog:
+    def __init__(self, key, artifacts, embed_model, index_config, compact_rows=50000, model_name=None,
+                 reload_seconds=5.0, compact_seconds=300.0, grace_seconds=600.0):
+        self.root_key = key
+        self.key = artifacts["manifest"]["key"]
+        self.embed_model = embed_model
+        self.index_config = index_config
+        self.compact_rows = compact_rows
+        self.model_name = model_name
+        self.reload_seconds = reload_seconds
+        self.compact_seconds = compact_seconds
+        self.grace_seconds = grace_seconds
+        self.current = CatalogSnapshot(artifacts)
+
+        # Writers are serialised; readers just take self.current
+        self._lock = threading.Lock()
+        self._replay = None
+        self._compaction = None
+        self.compactions = 0
+        self.last_compaction_seconds = None
+        self.reloads = 0
+        self.listeners = []
+
+        # Held for the life of the process; None in the read-only workers
+        self._writer = artifact_store.acquire_writer(key)
+        threading.Thread(target=self._background, name="catalog-background", daemon=True).start()
+
+    @property
+    def writer(self):
+        return self._writer is not None
+
+    def _check_writer(self):
+        if self._writer is None:
+            raise ReadOnlyCatalog("Catalog updates are handled by another worker")
+
+    def _background(self):
+        if self._writer is None:
+            self._follow()
+        # Writer: compact whatever is pending every compact_seconds (0 turns this off,
+        # leaving compact_rows) and clean up old compactions
+        while True:
+            time.sleep(self.compact_seconds or self.reload_seconds)
+            if self.compact_seconds and self.current.pending_changes() and self._compaction is None:
+                self.compact()
+            if self._compaction is None:
+                for key in artifact_store.remove_superseded(self.root_key, self.grace_seconds):
+                    print(f"Removed superseded catalog {key}")
+
+    def _follow(self):
+        # Read-only workers: swap in each new compaction until this one becomes the writer
+        while self._writer is None:
+            time.sleep(self.reload_seconds)
+            writer = artifact_store.acquire_writer(self.root_key)
+            try:
+                self.reload()
+            except Exception as e:
+                # Don't take over updates on top of a stale snapshot
+                print(f"Catalog reload failed: {e}")
+                if writer is not None:
+                    writer.close()
+                continue
+            self._writer = writer
+        print(f"Took over catalog updates for {self.root_key}")
+
+    def reload(self):
+        key = artifact_store.resolve(self.root_key)
+        if key == self.key:
+            return False
+        artifacts = artifact_store.load(key)
+        ann_index.set_search_params(artifacts["index"], self.index_config["nprobe"], self.index_config["ef_search"])
+        with self._lock:
+            self.current = CatalogSnapshot(artifacts)
+            self.key = key
+        self.reloads += 1
+        for listener in self.listeners:
+            listener()
+        print(f"Reloaded catalog {key} ({len(self.current)} products)")
+        return True
+
+    def _apply(self, op, *args):
+        with self._lock:
+            self.current = getattr(self.current, op)(*args)
+            if self._replay is not None:
+                self._replay.append((op, args))
+            pending = self.current.pending_changes()
+        for listener in self.listeners:
+            listener()
+        if pending >= self.compact_rows:
+            self.compact()
+
+    def upsert(self, products):
+        # products: dicts with "Uniq Id", "Product Name" and the catalog text columns;
+        # missing columns are treated like nulls in the parquet
+        self._check_writer()
+        if not products:
+            return 0
+        table = pa.table({column: pa.array([p.get(column) for p in products], pa.string())
+                          for column in TEXT_COLUMNS + ["Category"]})
+        ids = table.column("Uniq Id").to_pylist()
+        if any(not product_id or not product_id.isascii() for product_id in ids):
+            raise ValueError("Every product needs an ASCII 'Uniq Id'")
+
+        texts = combined_text(table).to_pylist()
+        # The expensive part runs before taking the lock
+        embeddings = encode_texts(self.embed_model, texts)
+        names = ["" if name is None else name for name in table.column("Product Name").to_pylist()]
+        self._apply("with_upserts", ids, names, texts, embeddings,
+                    table.column("Category").to_pylist(), [p.get("Selling Price") for p in products])
+        return len(ids)
+
+    def delete(self, product_ids):
+        self._check_writer()
+        snapshot = self.current
+        found = sum(snapshot.row_of(product_id) is not None for product_id in product_ids)
+        self._apply("with_deletes", list(product_ids))
+        return found
+
+    def compact(self, wait=False):
+        self._check_writer()
+        with self._lock:
+            if self._compaction is None:
+                self._replay = []
+                self._compaction = threading.Thread(target=self._compact, args=(self.current,),
+                                                    name="catalog-compaction", daemon=True)
+                self._compaction.start()
+            thread = self._compaction
+        if wait:
+            thread.join()
+
+    def _compact(self, snapshot):
+        start = time.perf_counter()
+        try:
+            key = artifact_store.make_key(f"{self.root_key}/{uuid.uuid4().hex}", self.model_name,
+                                          ann_index.describe(self.index_config))
+            artifacts = write_snapshot(snapshot, key, self.index_config,
+                                       {"model": self.model_name, "parent": self.key, "root": self.root_key})
+            compacted = CatalogSnapshot(artifacts)
+
+            with self._lock:
+                # Updates that landed while the new artifacts were being written
+                for op, args in self._replay:
+                    compacted = getattr(compacted, op)(*args)
+                self.current = compacted
+                self.key = key
+                artifact_store.set_current(self.root_key, key)
+            self.compactions += 1
+            self.last_compaction_seconds = round(time.perf_counter() - start, 2)
+            print(f"Compacted catalog into {key} ({len(compacted)} products, {self.last_compaction_seconds}s)")
+        finally:
+            with self._lock:
+                self._replay = None
+                self._compaction = None
+
+    def stats(self):
+        snapshot = self.current
+        return {
+            "key": self.key,
+            "writer": self.writer,
+            "products": len(snapshot),
+            "base_rows": snapshot.base_rows,
+            "delta_rows": len(snapshot.delta.ids),
+            "tombstones": int(snapshot.dead.sum()),
+            "compacting": self._compaction is not None,
+            "compactions": self.compactions,
+            "last_compaction_seconds": self.last_compaction_seconds,
+            "reloads": self.reloads,
+        }
+
+
+def write_snapshot(snapshot, key, index_config, manifest=None, chunk_rows=65536):
+    # Live rows only, straight from the stored embeddings
+    live = np.flatnonzero(~snapshot.dead)
+    dim = snapshot.delta.embeddings.shape[1]
+    with artifact_store.ArtifactBuilder(key, len(live), dim) as builder:
+        for offset in range(0, len(live), chunk_rows):
+            rows = live[offset:offset + chunk_rows]
+            products = [snapshot.product(row) for row in rows]
+            categories, prices = zip(*(snapshot.attribute_values(row) for row in rows)) if len(rows) else ((), ())
+            builder.add([p["Uniq Id"] for p in products], [p["Product Name"] for p in products],
+                        [p["Combined Text"] for p in products], snapshot.embedding_rows(rows), categories, prices)
+        index = ann_index.build_index(builder.embeddings, index_config)
+        builder.commit(index, manifest)
+
+    artifacts = artifact_store.load(key)
+    ann_index.set_search_params(artifacts["index"], index_config["nprobe"], index_config["ef_search"])
+    return artifacts
@@ -0,0 +1,90 @@
+import asyncio
+import random
+
+# Async wrapper around a Gemini GenerativeModel (or anything with the same
+# generate_content / generate_content_async interface, e.g. fake_llm.FakeGenerativeModel).
+# Calls run concurrently up to max_concurrency, each attempt has its own timeout,
+# and transient failures are retried with exponential backoff and full jitter.
+
+
+class EmptyReplyError(ValueError):
+    # The model answered without text (blocked or empty candidate)
+    pass
+
+
+RETRYABLE_ERRORS = (asyncio.TimeoutError, ConnectionError)
+# Everything generate can raise once retries are used up; callers that can degrade
+# (intent extraction, summaries) catch these instead of failing the request
+LLM_ERRORS = (EmptyReplyError,)
+
+try:
+    from google.api_core import exceptions as google_exceptions
+
+    RETRYABLE_ERRORS += (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+    LLM_ERRORS += (google_exceptions.GoogleAPIError,)
+except ImportError:
+    pass
+
+try:
+    from google.generativeai.types import BlockedPromptException, StopCandidateException
+
+    LLM_ERRORS += (BlockedPromptException, StopCandidateException)
+except ImportError:
+    pass
+
+LLM_ERRORS += RETRYABLE_ERRORS
+
+
+class AsyncLLMClient:
+    def __init__(self, model, max_concurrency=8, timeout=30.0, max_retries=3, backoff=0.5, max_backoff=8.0):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    async def _call(self, prompt, **kwargs):
+        if hasattr(self.model, "generate_content_async"):
+            return await self.model.generate_content_async(prompt, **kwargs)
+        # Sync-only clients run on a worker thread so the event loop stays free
+        return await asyncio.to_thread(self.model.generate_content, prompt, **kwargs)
+
+    async def generate(self, prompt, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self.calls += 1
+                    response = await asyncio.wait_for(self._call(prompt, **kwargs), self.timeout)
+                try:
+                    return response.text
+                except ValueError as e:
+                    # Blocked or empty candidate; asking the same thing again won't help
+                    raise EmptyReplyError(str(e)) from None
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                # Full jitter keeps concurrent retries from hitting the API in lockstep
+                await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    async def generate_many(self, prompts, return_exceptions=False, **kwargs):
+        # With return_exceptions, a prompt that still fails after its retries gives its
+        # exception in place of the text instead of failing the whole batch
+        return await asyncio.gather(*(self.generate(prompt, **kwargs) for prompt in prompts),
+                                    return_exceptions=return_exceptions)
+
+    def stats(self):
+        return {"calls": self.calls, "retries": self.retries, "timeouts": self.timeouts, "failures": self.failures}
@@ -0,0 +1,66 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+# Load test for the API: fires the same text request at increasing concurrency and
+# reports throughput and latency percentiles per level. With handlers that block the
+# event loop, throughput stays flat and p99 grows with concurrency; with blocking work
+# offloaded it should scale until the worker pools saturate.
+# Start the API without touching Gemini, then run:
+#   FAKE_LLM=1 FAKE_LLM_LATENCY=0.5 uvicorn main:app --port 8000
+#   python load_test.py --concurrency 1 2 4 8 16 32
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Throughput / latency of /process-text/ vs. concurrent clients")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/process-text/")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--query", default="Add milk, bread and a toothpaste")
+    parser.add_argument("--summary", default="lazy", choices=["sync", "lazy", "background"])
+    return parser.parse_args()
+
+
+def send(session, args, client_id):
+    timings = []
+    errors = 0
+    for _ in range(args.requests_per_client):
+        start = time.perf_counter()
+        try:
+            response = session.post(args.url, data={
+                "username": f"load-test-{client_id}",
+                "user_query": args.query,
+                "summary": args.summary
+            })
+            response.raise_for_status()
+        except requests.RequestException:
+            errors += 1
+        timings.append(time.perf_counter() - start)
+    return timings, errors
+
+
+def run_level(args, clients):
+    sessions = [requests.Session() for _ in range(clients)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(lambda i: send(sessions[i], args, i), range(clients)))
+    elapsed = time.perf_counter() - start
+
+    timings = np.array([t for result, _ in results for t in result]) * 1000
+    errors = sum(e for _, e in results)
+    return len(timings) / elapsed, np.percentile(timings, 50), np.percentile(timings, 99), errors
+
+
+def main():
+    args = parse_args()
+    print(f"{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for clients in args.concurrency:
+        throughput, p50, p99, errors = run_level(args, clients)
+        print(f"{clients:>8}{throughput:>10.2f}{p50:>10.0f}{p99:>10.0f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,52 @@
-import sqlite3
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from scipy.optimize import linear_sum_assignment
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Create in-memory SQLite DB (or use 'cart.db' to save to file)
-conn = sqlite3.connect(":memory:")  # Use 'cart.db' for persistent file
-cursor = conn.cursor()
-
-# Create the user_cart table
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS user_cart (
-    user_id TEXT,
-    product_id TEXT,
-    product_name TEXT,
-    combined_details TEXT,
-    PRIMARY KEY (user_id, product_id)
-)
-""")
-conn.commit()
+import os
+from cart_repository import cart_repository_from_env
+
+# Cart storage backend picked with CART_BACKEND: sqlite, redis or memory (see cart_repository.py)
+cart_repo = cart_repository_from_env()
 
 print("-----------Table Creation Completed------------")
 
-def add_to_cart(user_id, product_id, product_name, combined_details):
-    try:
-        cursor.execute(
-            """
-            INSERT INTO user_cart (user_id, product_id, product_name, combined_details)
-            VALUES (?, ?, ?, ?)
-            """,
-            (user_id, product_id, product_name, combined_details)
-        )
-        conn.commit()
-        return {"message": f"Product '{product_name}' added to cart for user {user_id}"}
-    except sqlite3.IntegrityError:
-        return {"message": f"Product '{product_name}' already in cart for user {user_id}"}
-
-def get_cart(user_id):
-    cursor.execute(
-        "SELECT product_id, product_name, combined_details FROM user_cart WHERE user_id = ?",
-        (user_id,)
-    )
-    rows = cursor.fetchall()
-    if not rows:
-        return {"message": "Cart is empty."}
-    products = [
-        {"product_id": row[0], "product_name": row[1], "details": row[2]}
-        for row in rows
+# Carts store product references only; names, details and embeddings come from the catalog
+def add_many_to_cart(user_id, items):
+    # items: dicts with product_id and optional quantity / attributes
+    quantities = cart_repo.add_many(user_id, items)
+    popularity.add([item["product_id"] for item in items])
+    names = get_product_names([item["product_id"] for item in items])
+    return [
+        {"message": f"Product '{name}' added to cart for user {user_id}"} if quantity == item.get("quantity", 1)
+        else {"message": f"Product '{name}' quantity is now {quantity} for user {user_id}"}
+        for item, name, quantity in zip(items, names, quantities)
     ]
+
+def add_to_cart(user_id, product_id, quantity=1, attributes=None):
+    return add_many_to_cart(user_id, [{"product_id": product_id, "quantity": quantity, "attributes": attributes}])[0]
+
+CART_VIEWS = ("full", "summary")
+
+def get_cart(user_id, view="full"):
+    items = cart_repo.get(user_id)
+    if not items:
+        return {"message": "Cart is empty."}
+
+    product_ids = [item["product_id"] for item in items]
+    if view == "summary":
+        # Lightweight projection: ids, names and quantities only
+        products = [
+            {"product_id": item["product_id"], "product_name": name or stored_name(item), "quantity": item["quantity"]}
+            for item, name in zip(items, get_product_names(product_ids))
+        ]
+    else:
+        products = [
+            {"product_id": item["product_id"], "product_name": product["Product Name"] or stored_name(item),
+             "details": product["Combined Text"], "quantity": item["quantity"], "attributes": item["attributes"]}
+            for item, product in zip(items, get_products(product_ids))
+        ]
     return {"user_id": user_id, "products": products}
 
 print("-----------------Starting RAG building----------------")
@@ -62,93 +60,212 @@ from langchain.chat_models import init_chat_model
 
 llm = init_chat_model("gemini-2.0-flash", model_provider="google_genai")
 
-import pandas as pd
-
 print("--------------------Loading Datasets-------------------")
-df = pd.read_parquet("hf://datasets/philschmid/amazon-product-descriptions-vlm/data/train-00000-of-00001.parquet")
+from catalog import EMBED_MODEL_NAME, encode_texts, fetch_catalog
 
-df['combined_text'] = df.apply(
-    lambda row: f"About Product: {row['About Product']}\n"
-                f"Product Specification: {row['Product Specification']}\n"
-                f"Technical Details: {row['Technical Details']}\n"
-                f"Description: {row['description']}", axis=1
-)
+CATALOG_PATH = fetch_catalog()
 
 print("-------------------Sentence Transformers---------------")
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
-# Load model
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Compute embeddings
-df['embedding'] = df['combined_text'].apply(lambda x: embed_model.encode(x, convert_to_numpy=True))
+import ann_index
+import artifact_store
 
-import faiss
+# Load model
+embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+
+# Index backend and search parameters come from INDEX_* env vars (see ann_index.py)
+index_config = ann_index.config_from_env()
+index_spec = ann_index.describe(index_config)
+
+# Reuse the catalog store and index from a previous start when catalog, model and index spec are unchanged
+artifact_key = artifact_store.make_key(artifact_store.file_digest(CATALOG_PATH), EMBED_MODEL_NAME, index_spec)
+# (or the newest compaction of it, if the catalog has been updated incrementally)
+artifacts = artifact_store.load(artifact_store.resolve(artifact_key))
+
+if artifacts is None:
+    # Cold start fallback; run build_index.py offline to avoid paying this at startup
+    print("-------------------Building embeddings and index-------------------")
+    # Streams the parquet batch by batch (see ingest.py), so memory stays bounded
+    from ingest import build_artifacts
+
+    build_artifacts(CATALOG_PATH, artifact_key, embed_model, index_config, manifest={"model": EMBED_MODEL_NAME})
+
+    # Serve from the files just written, exactly like a warm start
+    artifacts = artifact_store.load(artifact_key)
+
+print(f"-------------------Loaded artifacts {artifacts['manifest']['key']}-------------------")
+ann_index.set_search_params(artifacts["index"], index_config["nprobe"], index_config["ef_search"])
+
+# Memory-mapped catalog (see catalog_store.py) plus in-memory upserts and deletes
+# (see live_catalog.py). Every lookup works on live_catalog.current, an immutable
+# snapshot, so a request never sees a half-applied catalog update.
+from live_catalog import LiveCatalog, ReadOnlyCatalog
+
+live_catalog = LiveCatalog(artifact_key, artifacts, embed_model, index_config,
+                           compact_rows=int(os.getenv("CATALOG_COMPACT_ROWS", "50000")),
+                           model_name=EMBED_MODEL_NAME,
+                           reload_seconds=float(os.getenv("CATALOG_RELOAD_SECONDS", "5")),
+                           compact_seconds=float(os.getenv("CATALOG_COMPACT_SECONDS", "300")),
+                           grace_seconds=float(os.getenv("CATALOG_GRACE_SECONDS", "600")))
+del artifacts
+
+def get_products(ids):
+    catalog = live_catalog.current
+    products = []
+    for product_id in ids:
+        row = catalog.row_of(product_id)
+        if row is None:
+            products.append({"Uniq Id": product_id, "Product Name": None, "Combined Text": None})
+        else:
+            products.append(catalog.product(row))
+    return products
 
-# Convert embeddings to numpy array
-embedding_matrix = np.stack(df['embedding'].values)
+def get_product_names(ids):
+    catalog = live_catalog.current
+    rows = [catalog.row_of(i) for i in ids]
+    return [catalog.name(row) if row is not None else None for row in rows]
 
-# Create FAISS index
-index = faiss.IndexFlatL2(embedding_matrix.shape[1])
-index.add(embedding_matrix)
 
+# What a cart line was added as, for products no longer in the catalog
+def stored_name(item):
+    attributes = item.get("attributes") or {}
+    return attributes.get("name") or attributes.get("query") or item["product_id"]
 
 # Remove from Cart function is defined here
 
-def remove_from_cart(user_id, user_input):
-    # Step 1: Get all products in the user's cart
-    cursor.execute(
-        "SELECT product_id, product_name, combined_details FROM user_cart WHERE user_id = ?",
-        (user_id,)
-    )
-    rows = cursor.fetchall()
-
-    if not rows:
-        return {"message": "Cart is empty. Nothing to remove."}
-
-    # Step 2: Encode user input and all cart items
-    input_embedding = embed_model.encode(user_input, convert_to_numpy=True)
-
-    cart_embeddings = []
-    product_info = []
-    for row in rows:
-        combined_text = f"{row[1]} - {row[2]}"  # product_name - combined_details
-        cart_embeddings.append(embed_model.encode(combined_text, convert_to_numpy=True))
-        product_info.append({
-            "product_id": row[0],
-            "product_name": row[1],
-            "combined_details": row[2]
+def remove_many_from_cart(user_id, user_inputs):
+    if not user_inputs:
+        return {"message": "Nothing to remove.", "removed": []}
+
+    # Step 1: Get all products in the user's cart, including lines whose product has
+    # since been deleted from the catalog, so they can still be removed
+    catalog = live_catalog.current
+    items = cart_repo.get(user_id)
+    if not items:
+        return {"message": "Cart is empty. Nothing to remove.", "removed": []}
+    rows = [catalog.row_of(item["product_id"]) for item in items]
+    known = [i for i, row in enumerate(rows) if row is not None]
+    deleted = [i for i, row in enumerate(rows) if row is None]
+
+    # Step 2: Encode all requested phrases at once; cart items reuse their catalog
+    # embeddings, deleted ones are encoded from the name / query stored with the line
+    input_embeddings = encode_texts(embed_model, user_inputs)
+    cart_embeddings = np.empty((len(items), input_embeddings.shape[1]), dtype=np.float32)
+    if known:
+        cart_embeddings[known] = catalog.embedding_rows([rows[i] for i in known])
+    if deleted:
+        cart_embeddings[deleted] = encode_texts(embed_model, [stored_name(items[i]) for i in deleted])
+
+    # Step 3: Cosine similarity of every phrase against every cart item as one matmul
+    # (all embeddings are stored L2-normalized)
+    similarities = input_embeddings @ cart_embeddings.T
+
+    # Step 4: One-to-one assignment, so two phrases never remove the same item
+    phrase_indices, item_indices = linear_sum_assignment(similarities, maximize=True)
+
+    removed = []
+    matched = get_products([items[i]["product_id"] for i in item_indices])
+    for phrase_index, item_index, product in zip(phrase_indices, item_indices, matched):
+        removed.append({
+            "query": user_inputs[phrase_index],
+            "product_id": product["Uniq Id"],
+            "product_name": product["Product Name"] or stored_name(items[item_index]),
+            "combined_details": product["Combined Text"],
+            "score": float(similarities[phrase_index, item_index])
         })
 
-    # Step 3: Compute cosine similarity
-    similarities = cosine_similarity([input_embedding], cart_embeddings)[0]
-    best_index = int(np.argmax(similarities))
-    best_match = product_info[best_index]
+    # Step 5: Remove all matched products in a single transaction
+    cart_repo.remove_many(user_id, [item["product_id"] for item in removed])
 
-    # Step 4: Remove the most similar product
-    cursor.execute(
-        "DELETE FROM user_cart WHERE user_id = ? AND product_id = ?",
-        (user_id, best_match["product_id"])
-    )
-    conn.commit()
+    names = ", ".join(f"'{item['product_name']}'" for item in removed)
+    return {"message": f"Removed products {names} from cart.", "removed": removed}
+
+def remove_from_cart(user_id, user_input):
+    result = remove_many_from_cart(user_id, [user_input])
+    if not result["removed"]:
+        return {"message": result["message"]}
 
+    best_match = result["removed"][0]
     return {
         "message": f"Removed product '{best_match['product_name']}' from cart.",
         "matched_details": best_match["combined_details"]
     }
 
-def retrieve_best_product_metadata(user_query, top_k=1):
-    query_embedding = embed_model.encode(user_query, convert_to_numpy=True)
-    scores, indices = index.search(np.array([query_embedding]), top_k)
-
-    best_match = df.iloc[indices[0][0]]
+# "hybrid" fuses dense and BM25 candidates (see lexical_index.py); "dense" is embeddings only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Candidates re-ranked by reranker.py after the first stage; 0 keeps the first-stage order
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+
+# Colour / size / price in a phrase ("blue nail paint", "1kg horlicks") become hard
+# filters applied inside the index search (see attributes.py)
+ATTRIBUTE_FILTERS = os.getenv("ATTRIBUTE_FILTERS", "1") == "1"
+
+import reranker
+from attributes import colours as attribute_colours, parse_filters, sizes as attribute_sizes
+
+popularity = reranker.Popularity()
+
+def query_filters(phrases):
+    return [parse_filters(phrase) if ATTRIBUTE_FILTERS else {} for phrase in phrases]
+
+def first_stage(catalog, query_embeddings, phrases, k, allowed):
+    if RETRIEVAL_MODE == "hybrid":
+        return catalog.hybrid_search(query_embeddings, phrases, k, max(HYBRID_CANDIDATES, k), RRF_K, allowed)
+    scores, indices = catalog.search_each(query_embeddings, k, allowed)
+    return [(rows[rows >= 0].tolist(), s[rows >= 0].tolist()) for s, rows in zip(scores, indices)]
+
+def retrieve_candidates(catalog, query_embeddings, phrases, k, filters=None):
+    # First stage: (rows, scores) per query, best first
+    allowed = None
+    if filters and any(filters):
+        allowed = [catalog.allowed(f) for f in filters]
+        # A filter nothing in the catalog passes is dropped rather than returning nothing
+        allowed = [mask if mask is not None and mask.any() else None for mask in allowed]
+    candidates = first_stage(catalog, query_embeddings, phrases, k, allowed)
+
+    # IVF / HNSW can still come back empty on a very selective filter; retry those unfiltered
+    retry = [i for i, (rows, _) in enumerate(candidates) if not rows and allowed and allowed[i] is not None]
+    if retry:
+        for i, result in zip(retry, first_stage(catalog, query_embeddings[retry], [phrases[i] for i in retry], k, None)):
+            candidates[i] = result
+    return candidates
+
+def rank_products(query_embeddings, phrases, top_k=1, filters=None):
+    # Ranked list of products with scores for every query
+    catalog = live_catalog.current
+    filters = filters if filters is not None else query_filters(phrases)
+    candidates = retrieve_candidates(catalog, query_embeddings, phrases, max(top_k, RERANK_CANDIDATES), filters)
+
+    ranked = []
+    for phrase, (rows, scores) in zip(phrases, candidates):
+        # Only the candidates' text is read from the catalog store
+        products = [catalog.product(int(row)) for row in rows]
+        if RERANK_CANDIDATES:
+            products = reranker.rerank(phrase, products, scores, popularity)
+        else:
+            products = [dict(p, Score=round(float(score), 4)) for p, score in zip(products, scores)]
+        ranked.append(products[:top_k])
+    return ranked
+
+def retrieve_by_embeddings(query_embeddings, phrases, filters=None):
+    return [products[0] if products else None for products in rank_products(query_embeddings, phrases, 1, filters)]
+
+def retrieve_best_products_metadata(queries, top_k=1):
+    # One ranked list of up to top_k products per query (empty when nothing matched)
+    if not queries:
+        return []
+
+    # One encode call and one first-stage search for every product phrase in the request
+    return rank_products(encode_texts(embed_model, queries), queries, top_k)
 
-    return {
-        "Uniq Id": best_match["Uniq Id"],
-        "Product Name": best_match["Product Name"],
-        "Combined Text": best_match["combined_text"]
-    }
+def retrieve_best_product_metadata(user_query, top_k=1):
+    # The best product for one query, or None
+    ranked = retrieve_best_products_metadata([user_query], top_k)[0]
+    return ranked[0] if ranked else None
 
 
 print("--------------------Intent Recognition configurating---------------------")
@@ -157,10 +274,10 @@ import google.generativeai as genai
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 model = genai.GenerativeModel("gemini-1.5-pro")
 
-def get_best_product_info(user_query):
-    product_info = retrieve_best_product_metadata(user_query)
+SUMMARY_CONFIG = {"temperature": 0.2}
 
-    prompt = f"""
+def summary_prompt(user_query, product_info):
+    return f"""
     You are a helpful assistant. Based on the product details below, summarize how it fits the user's query.
 
     --- USER QUERY ---
@@ -172,14 +289,144 @@ def get_best_product_info(user_query):
     Respond concisely and helpfully.
     """
 
-    response = model.generate_content(prompt, generation_config={"temperature": 0.2})
+async def generate_summary(user_query, product_info):
+    # Through llm_client like every other model call: timeout, retries, concurrency limit
+    return await llm_client.generate(summary_prompt(user_query, product_info), generation_config=SUMMARY_CONFIG)
+
+# Two-level query cache in front of retrieval + summary (see query_cache.py)
+from collections import Counter
+from query_cache import LRUCache, SemanticCache, normalize_query
+from summaries import SummaryJobs
+
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+exact_cache = LRUCache(int(os.getenv("QUERY_CACHE_SIZE", "10000")), QUERY_CACHE_TTL)
+semantic_cache = SemanticCache(
+    embed_model.get_sentence_embedding_dimension(),
+    float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    int(os.getenv("SEMANTIC_CACHE_SIZE", "2000")),
+    QUERY_CACHE_TTL,
+)
 
-    return {
-        "Uniq Id": product_info["Uniq Id"],
-        "Product Name": product_info["Product Name"],
-        "Gemini Response": response.text,
-        "Combined Text": product_info["Combined Text"]
-    }
+# Summaries the endpoints defer instead of generating inline (see summaries.py)
+SUMMARY_MODES = ("sync", "lazy", "background")
+summary_jobs = SummaryJobs()
+
+# How many lookups each retrieval path answered, for /cache-stats/
+retrieval_stats = Counter()
+
+# Cached lookups may point at products that were just changed or deleted
+live_catalog.listeners += [exact_cache.clear, semantic_cache.clear]
+
+def lookup_products(user_queries, phrases=None):
+    # Cached entries are shared dicts; a summary generated later is stored into the
+    # entry so every future hit on it gets the summary for free.
+    # A query with no match (empty catalog, every candidate deleted) gives None,
+    # which is never cached.
+    # phrases are the bare product phrases (without the intent) for lexical matching.
+    phrases = phrases or user_queries
+    results = [None] * len(user_queries)
+    keys = [normalize_query(q) for q in user_queries]
+
+    # Level 1: exact match on the normalized phrase
+    misses = []
+    for i, key in enumerate(keys):
+        cached = exact_cache.get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            misses.append(i)
+    if not misses:
+        return results
+
+    # A phrase that is exactly a product name needs no embedding or index search
+    if RETRIEVAL_MODE == "hybrid":
+        catalog = live_catalog.current
+        remaining = []
+        for i in misses:
+            row = catalog.exact_name(phrases[i])
+            if row is not None:
+                results[i] = catalog.product(row)
+                exact_cache.put(keys[i], results[i])
+                retrieval_stats["exact_name"] += 1
+            else:
+                remaining.append(i)
+        misses = remaining
+        if not misses:
+            return results
+
+    # Level 2: a previous query that is semantically the same. Skipped for phrases
+    # with attribute filters: "blue nail paint" and "red nail paint" embed almost alike
+    filters = query_filters(phrases)
+    query_embeddings = encode_texts(embed_model, [user_queries[i] for i in misses])
+    remaining = []
+    for i, embedding in zip(misses, query_embeddings):
+        cached = semantic_cache.get(embedding) if not filters[i] else None
+        if cached is not None:
+            results[i] = cached
+            exact_cache.put(keys[i], cached)
+        else:
+            remaining.append((i, embedding))
+
+    # Everything else goes through the index in one search
+    if remaining:
+        products_info = retrieve_by_embeddings(np.stack([e for _, e in remaining]),
+                                               [phrases[i] for i, _ in remaining],
+                                               [filters[i] for i, _ in remaining])
+        retrieval_stats[RETRIEVAL_MODE] += len(remaining)
+        for (i, embedding), info in zip(remaining, products_info):
+            results[i] = info
+            if info is None:
+                continue
+            exact_cache.put(keys[i], info)
+            if not filters[i]:
+                semantic_cache.put(embedding, info)
+
+    return results
+
+async def store_summary(user_query, entry):
+    entry["Gemini Response"] = await generate_summary(user_query, entry)
+    return entry["Gemini Response"]
+
+async def get_best_products_info(user_queries, summary_mode="sync", phrases=None):
+    results = []
+    pending = []
+    entries = await run_blocking(cpu_executor, lookup_products, user_queries, phrases)
+    for user_query, entry in zip(user_queries, entries):
+        if entry is None:
+            results.append(None)
+            continue
+        result = dict(entry)
+        if "Gemini Response" not in entry:
+            if summary_mode == "sync":
+                pending.append((user_query, entry, result))
+            else:
+                # Return right after retrieval; the summary is fetched later by id
+                result["Summary Id"] = summary_jobs.create(
+                    lambda q=user_query, e=entry: store_summary(q, e),
+                    start=summary_mode == "background"
+                )
+        results.append(result)
+
+    # Sync summaries for all products run concurrently instead of one after another.
+    # Summaries are optional: a failed one is reported on its product and the cart
+    # update goes ahead; it isn't cached, so the next lookup tries again.
+    if pending:
+        summaries = await llm_client.generate_many(
+            [summary_prompt(user_query, entry) for user_query, entry, _ in pending],
+            return_exceptions=True,
+            generation_config=SUMMARY_CONFIG
+        )
+        for (_, entry, result), summary in zip(pending, summaries):
+            if isinstance(summary, Exception):
+                result["Gemini Response"] = None
+                result["Summary Error"] = f"Summary unavailable: {type(summary).__name__}"
+            else:
+                entry["Gemini Response"] = result["Gemini Response"] = summary
+
+    return results
+
+async def get_best_product_info(user_query):
+    return (await get_best_products_info([user_query]))[0]
 
 import google.generativeai as genai
 
@@ -189,53 +436,37 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))  # Replace with your actual
 # Load Gemini model
 model = genai.GenerativeModel("gemini-1.5-pro")
 
-# Define prompt template
-def get_prompt(user_input):
-    return f"""
-You are an assistant for a shopping app. Your task is to:
-1. Identify the user's intent from one of these: ["add the products", "remove the product", "show the products"]
-2. Extract and list the products mentioned in the query as a list of strings.
-
-Respond strictly in the following format (JSON-like):
-Intent: {{<intent>}}
-Products: [<product1>, <product2>, ..., <productN>]
-
-Example Input: "I want a toothpaste, a 1kg horlicks pack and a nail paint of blue color"
-Output:
-Intent: {{add the products}}
-Products: ["toothpaste", "1kg horlicks pack", "nail paint of blue color"]
-
-Now process the following input:
-"{user_input}"
-"""
-
-# Function to call Gemini and parse response
-def extract_intent_and_products(user_input):
-    prompt = get_prompt(user_input)
-    response = model.generate_content(prompt)
-    text = response.text.strip()
-
-    # Parse output
-    lines = text.splitlines()
-    intent = None
-    products = []
-
-    for line in lines:
-        if line.lower().startswith("intent:"):
-            intent = line.split(":", 1)[1].strip().strip("{}")
-        elif line.lower().startswith("products:"):
-            products_line = line.split(":", 1)[1].strip()
-            try:
-                products = eval(products_line)  # Use with caution; assumes well-formed Gemini output
-            except:
-                pass
-
-    return intent, products
+# Prompt, JSON schema and strict reply parsing live in intents.py
+from intents import Intent, extract_intent, extract_intent_from_media
+# Local fast path (see intent_classifier.py): common commands like "add milk and eggs"
+# or "show my cart" are answered on-box in milliseconds; only results below
+# INTENT_CONFIDENCE (or with INTENT_CLASSIFIER=0) go to Gemini.
+from intent_classifier import IntentClassifier
+
+INTENT_CLASSIFIER = os.getenv("INTENT_CLASSIFIER", "1") != "0"
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", "0.75"))
+# Re-asks after a Gemini reply that doesn't parse, before giving up on the request
+INTENT_MAX_REASKS = int(os.getenv("INTENT_MAX_REASKS", "2"))
+intent_classifier = IntentClassifier(embed_model) if INTENT_CLASSIFIER else None
+# Which path answered each intent extraction, plus parse failures and re-asks, for /cache-stats/
+intent_stats = Counter()
+
+# Returns (Intent, products), or (None, []) when Gemini never gave a usable reply
+async def extract_intent_and_products(user_input):
+    if intent_classifier is not None:
+        result = await run_blocking(cpu_executor, intent_classifier.classify, user_input)
+        if result.confidence >= INTENT_CONFIDENCE:
+            intent_stats["local"] += 1
+            return result.intent, result.products
+
+    intent_stats["gemini"] += 1
+    return await extract_intent(llm_client, user_input, INTENT_MAX_REASKS, intent_stats)
 
 print("--------------------------Making OCR based function------------------------------]")
 
 import google.generativeai as genai
 from PIL import Image
+import asyncio
 import io
 
 # Setup Gemini
@@ -244,17 +475,43 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 # Load Gemini multimodal model (for image + text input)
 model = genai.GenerativeModel("gemini-1.5-pro")
 
-# Function to extract user query from image using Gemini OCR
-def extract_text_from_image(image_path):
-    with open(image_path, "rb") as f:
-        image_data = f.read()
-    image = Image.open(io.BytesIO(image_data))
+if os.getenv("FAKE_LLM"):
+    # Offline / load-test mode: canned replies with a fixed latency, no API calls (see fake_llm.py)
+    from fake_llm import FakeGenerativeModel, canned_response
+    model = FakeGenerativeModel(latency=float(os.getenv("FAKE_LLM_LATENCY", "0.8")), respond=canned_response)
+
+# Concurrent, bounded, retrying, non-blocking access to the model (see llm_client.py)
+from llm_client import LLM_ERRORS, AsyncLLMClient
+
+llm_client = AsyncLLMClient(
+    model,
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+)
+
+import mimetypes
+
+# Uploads as the model takes them, built straight from the uploaded bytes (nothing is
+# written to disk) and shared by both media paths below
+def media_part(data, content_type, filename, kind):
+    mime_type = content_type if content_type and content_type.startswith(f"{kind}/") else None
+    mime_type = mime_type or mimetypes.guess_type(filename or "")[0]
+    if kind == "image" and not (mime_type or "").startswith("image/"):
+        # Unknown image type: let PIL sniff it
+        return Image.open(io.BytesIO(data))
+    return {
+        "mime_type": mime_type or "audio/mp3",
+        "data": data
+    }
 
+# Function to extract user query from image using Gemini OCR
+async def extract_text_from_image(image):
     # Just ask Gemini to extract text from image
-    response = model.generate_content(
+    response = await llm_client.generate(
         [image, "Extract the text content exactly as written from this image."]
     )
-    return response.text.strip()
+    return response.strip()
 
 # import whisper
 
@@ -265,30 +522,43 @@ def extract_text_from_image(image_path):
 #     result = audio_model.transcribe(audio_path)
 #     return result['text'].strip()
 
-import base64
+async def extract_text_from_audio(audio):
+    prompt = "Please transcribe this audio file to text."
 
-def extract_text_from_audio(audio_path):
-    with open(audio_path, "rb") as audio_file:
-        audio_bytes = audio_file.read()
-        audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
+    response = await llm_client.generate([audio, prompt])
 
-    prompt = "Please transcribe this audio file to text."
+    return response.strip()
+
+# MEDIA_MODE=single (default) asks for the transcript, intent and products of an image
+# or audio upload in one Gemini call; if that reply never parses, or with
+# MEDIA_MODE=two_step, the upload is transcribed first and the text goes through
+# extract_intent_and_products (local classifier, then Gemini).
+MEDIA_MODE = os.getenv("MEDIA_MODE", "single")
 
-    response = model.generate_content([
-        {
-            "mime_type": "audio/mp3",  # or audio/wav, adjust as needed
-            "data": audio_b64
-        },
-        prompt
-    ])
-    
-    return response.text.strip()
+async def extract_intent_from_upload(media, kind, extract_text):
+    # Returns (user_query, intent, products); intent is None if nothing usable came back
+    if MEDIA_MODE == "single":
+        transcript, intent, products = await extract_intent_from_media(llm_client, media, kind,
+                                                                       INTENT_MAX_REASKS, intent_stats)
+        if intent is not None:
+            intent_stats["single_pass"] += 1
+            return transcript, intent, products
+        intent_stats["single_pass_fallback"] += 1
+
+    try:
+        user_query = await extract_text(media)
+    except LLM_ERRORS:
+        intent_stats["llm_errors"] += 1
+        return None, None, []
+    if not user_query:
+        return user_query, None, []
+    intent, products = await extract_intent_and_products(user_query)
+    return user_query, intent, products
 
 import os
-from fastapi import FastAPI, UploadFile, Form, File
+from fastapi import FastAPI, UploadFile, Form, File, Body
 from fastapi.responses import JSONResponse
 from typing import List
-import shutil
 from pyngrok import ngrok
 import nest_asyncio
 
@@ -297,40 +567,137 @@ nest_asyncio.apply()
 
 app = FastAPI()
 
-@app.post("/process-image/")
-async def process_image(username: str = Form(...), image: UploadFile = File(...)):
-    # Save image
-    image_path = f"../data/{image.filename}"
-    with open(image_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
-
-    # Extract query
-    user_query = extract_text_from_image(image_path)
-
-    # Extract intent and products
-    intent, products = extract_intent_and_products(user_query)
-
-    # Get product IDs
-    product_ids = []
-    for product in products:
-        product_info = get_best_product_info(intent + " " + product)
-        product_ids.append(product_info)
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocking work never runs on the event loop. Encoding and FAISS search release the
+# GIL, so a thread pool gives real parallelism without copying the model per process.
+cpu_executor = ThreadPoolExecutor(int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 4))), thread_name_prefix="cpu")
+# Cart storage calls are blocking too (SQLite or a Redis round trip); one thread per pooled connection
+db_executor = ThreadPoolExecutor(int(os.getenv("CART_DB_POOL_SIZE", "4")), thread_name_prefix="cart-db")
+
+async def run_blocking(executor, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args))
+
+# Uploads are read once into memory; Starlette has already spooled them (to a private
+# temp file above 1 MB), so concurrent uploads with the same filename never collide
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+async def read_upload(upload):
+    # The upload's bytes, or None if it is larger than MAX_UPLOAD_BYTES
+    data = await upload.read(MAX_UPLOAD_BYTES + 1)
+    await upload.close()
+    return data if len(data) <= MAX_UPLOAD_BYTES else None
+
+def too_large():
+    return JSONResponse({"error": f"Upload larger than {MAX_UPLOAD_BYTES} bytes."}, status_code=413)
+
+@app.get("/cache-stats/")
+async def cache_stats():
+    return JSONResponse({"exact": exact_cache.stats(), "semantic": semantic_cache.stats(),
+                         "retrieval": dict(retrieval_stats), "intent": dict(intent_stats),
+                         "llm": llm_client.stats()})
+
+# Incremental catalog updates (see live_catalog.py). Products use the parquet's column
+# names, e.g. {"Uniq Id": ..., "Product Name": ..., "About Product": ..., "description": ...}
+# Only the writer worker takes updates (see live_catalog.py); the others answer 409,
+# so retry, and pick the changes up once they have been compacted.
+def read_only(e):
+    return JSONResponse({"error": str(e), "catalog": live_catalog.stats()}, status_code=409)
+
+@app.post("/catalog/upsert/")
+async def upsert_products(products: List[dict] = Body(...)):
+    try:
+        count = await run_blocking(cpu_executor, live_catalog.upsert, products)
+    except ReadOnlyCatalog as e:
+        return read_only(e)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse({"upserted": count, "catalog": live_catalog.stats()})
+
+@app.post("/catalog/delete/")
+async def delete_products(product_ids: List[str] = Body(...)):
+    try:
+        count = await run_blocking(cpu_executor, live_catalog.delete, product_ids)
+    except ReadOnlyCatalog as e:
+        return read_only(e)
+    return JSONResponse({"deleted": count, "catalog": live_catalog.stats()})
+
+@app.post("/catalog/compact/")
+async def compact_catalog():
+    # Starts a background compaction (no-op if one is already running)
+    try:
+        live_catalog.compact()
+    except ReadOnlyCatalog as e:
+        return read_only(e)
+    return JSONResponse(live_catalog.stats())
+
+@app.get("/catalog/stats/")
+async def catalog_stats():
+    return JSONResponse(live_catalog.stats())
+
+# Ranked candidates with their re-ranking scores, without touching the cart or Gemini
+# Explicit filters are added to the ones parsed from the query, e.g.
+#   /search/?q=nail paint&colour=blue&max_price=20
+@app.get("/search/")
+async def search_products(q: str, k: int = 5, colour: str = None, size: str = None, category: str = None,
+                          min_price: float = None, max_price: float = None):
+    k = max(1, min(k, 100))
+    filters = query_filters([q])[0]
+    if colour:
+        filters["colours"] = attribute_colours(colour)
+    if size:
+        filters["sizes"] = attribute_sizes(size)
+    for name, value in (("category", category), ("min_price", min_price), ("max_price", max_price)):
+        if value is not None:
+            filters[name] = value
+    ranked = await run_blocking(cpu_executor, lambda: rank_products(encode_texts(embed_model, [q]), [q], k, [filters])[0])
+    shown = {name: sorted(value) if isinstance(value, set) else value for name, value in filters.items()}
+    return JSONResponse({"query": q, "filters": shown, "products": ranked})
+
+@app.get("/summaries/{summary_id}")
+async def get_summary(summary_id: str):
+    summary = await summary_jobs.get(summary_id)
+    if summary is None:
+        return JSONResponse({"error": "Unknown summary id."}, status_code=404)
+    return JSONResponse(summary)
+
+async def handle_intent(username, user_query, intent, products, summary_mode="sync", cart_view="full"):
+    if summary_mode not in SUMMARY_MODES:
+        return JSONResponse({"error": f"summary must be one of {list(SUMMARY_MODES)}"}, status_code=400)
+    if cart_view not in CART_VIEWS:
+        return JSONResponse({"error": f"cart_view must be one of {list(CART_VIEWS)}"}, status_code=400)
+    if intent is None:
+        return JSONResponse({"error": "Could not understand the request, please rephrase it.", "query": user_query},
+                            status_code=422)
+
+    # Get product IDs for every extracted product in one retrieval round
+    matches = await get_best_products_info([f"{intent.value} {product}" for product in products], summary_mode,
+                                           phrases=products)
+    # Products with no match in the catalog are skipped and reported back
+    found = [(p, product) for p, product in zip(matches, products) if p is not None]
+    not_found = [product for p, product in zip(matches, products) if p is None]
+    product_ids = [p for p, _ in found]
 
     # Add to cart if applicable
-    if intent == "add the products":
-        for p in product_ids:
-            add_to_cart(username, p["Uniq Id"], p["Product Name"], p["Combined Text"])
-    elif intent == "remove the product":
-        for p in products:
-            remove_from_cart(username, p)
-    elif intent == "show the products":
-        cart = get_cart(username)
+    if intent == Intent.ADD:
+        items = [
+            {"product_id": p["Uniq Id"], "quantity": 1, "attributes": {"query": product, "name": p["Product Name"]}}
+            for p, product in found
+        ]
+        if items:
+            await run_blocking(db_executor, add_many_to_cart, username, items)
+    elif intent == Intent.REMOVE:
+        await run_blocking(db_executor, remove_many_from_cart, username, products)
+    elif intent == Intent.SHOW:
+        cart = await run_blocking(db_executor, get_cart, username, cart_view)
         return JSONResponse({
             "username": username,
             "query": user_query,
             "intent": intent,
             "products": products,
             "product_ids": product_ids,
+            "not_found": not_found,
             "cart": cart
         })
 
@@ -339,101 +706,50 @@ async def process_image(username: str = Form(...), image: UploadFile = File(...)
         "query": user_query,
         "intent": intent,
         "products": products,
-        "product_ids": product_ids
+        "product_ids": product_ids,
+        "not_found": not_found
     })
-print("---------------------Image API Build complete----------------------")
 
-@app.post("/process-voice/")
-async def process_voice(username: str = Form(...), audio: UploadFile = File(...)):
-    # Save audio file
-    if not audio.filename:
-        return JSONResponse({"error": "No audio file provided."}, status_code=400)
+@app.post("/process-image/")
+async def process_image(username: str = Form(...), image: UploadFile = File(...),
+                        summary: str = Form("sync"), cart_view: str = Form("full")):
+    data = await read_upload(image)
+    if data is None:
+        return too_large()
+
+    # Extract query, intent and products
+    part = media_part(data, image.content_type, image.filename, "image")
+    user_query, intent, products = await extract_intent_from_upload(part, "image", extract_text_from_image)
 
-    voice_path = f"../data/{audio.filename}"
-    with open(voice_path, "wb") as buffer:
-        shutil.copyfileobj(audio.file, buffer)
+    return await handle_intent(username, user_query, intent, products, summary, cart_view)
+
+print("---------------------Image API Build complete----------------------")
 
-    # Extract query from voice
-    user_query = extract_text_from_audio(voice_path)
+@app.post("/process-voice/")
+async def process_voice(username: str = Form(...), audio: UploadFile = File(...),
+                        summary: str = Form("sync"), cart_view: str = Form("full")):
+    data = await read_upload(audio)
+    if not data:
+        return JSONResponse({"error": "No audio file provided."}, status_code=400) if data is not None else too_large()
+
+    # Extract query, intent and products from voice
+    part = media_part(data, audio.content_type, audio.filename, "audio")
+    user_query, intent, products = await extract_intent_from_upload(part, "audio", extract_text_from_audio)
     if not user_query:
         return JSONResponse({"error": "Could not transcribe audio."}, status_code=422)
 
-    # Extract intent and products
-    intent, products = extract_intent_and_products(user_query)
-    intent = intent.strip().lower()
-
-    # Get product IDs
-    product_ids = []
-    for product in products:
-        product_info = get_best_product_info(f"{intent} {product}")
-        product_ids.append(product_info)
-
-    # Handle intent
-    if intent == "add the products":
-        for p in product_ids:
-            add_to_cart(username, p["Uniq Id"], p["Product Name"], p["Combined Text"])
-    elif intent == "remove the product":
-        for p in products:
-            remove_from_cart(username, p)
-    elif intent == "show the products":
-        cart = get_cart(username)
-        return JSONResponse({
-            "username": username,
-            "query": user_query,
-            "intent": intent,
-            "products": products,
-            "product_ids": product_ids,
-            "cart": cart
-        })
-
-    # Default response
-    return JSONResponse({
-        "username": username,
-        "query": user_query,
-        "intent": intent,
-        "products": products,
-        "product_ids": product_ids
-    })
+    return await handle_intent(username, user_query, intent, products, summary, cart_view)
 
 print("---------------------Voice API Build complete----------------------")
 
 @app.post("/process-text/")
-async def process_text(username: str = Form(...), user_query: str = Form(...)):
+async def process_text(username: str = Form(...), user_query: str = Form(...),
+                       summary: str = Form("sync"), cart_view: str = Form("full")):
     user_query = user_query
 
     # Extract intent and products
-    intent, products = extract_intent_and_products(user_query)
-
-    # Get product IDs
-    product_ids = []
-    for product in products:
-        product_info = get_best_product_info(intent + " " + product)
-        product_ids.append(product_info)
+    intent, products = await extract_intent_and_products(user_query)
 
-    # Add to cart if applicable
-    if intent == "add the products":
-        for p in product_ids:
-            add_to_cart(username, p["Uniq Id"], p["Product Name"], p["Combined Text"])
-    elif intent == "remove the product":
-        for p in products:
-            remove_from_cart(username, p)
-    elif intent == "show the products":
-        cart = get_cart(username)
-        return JSONResponse({
-            "username": username,
-            "query": user_query,
-            "intent": intent,
-            "products": products,
-            "product_ids": product_ids,
-            "cart": cart
-        })
-
-    return JSONResponse({
-        "username": username,
-        "query": user_query,
-        "intent": intent,
-        "products": products,
-        "product_ids": product_ids
-    })
+    return await handle_intent(username, user_query, intent, products, summary, cart_view)
 
 print("---------------------Text API Build complete----------------------")
\ No newline at end of file
@@ -0,0 +1,72 @@
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# Server-side fallback for shrinking uploads. The page served by frontend.py does the
+# same in the browser before uploading (preprocessUpload), since upload time is most
+# of the latency on mobile networks; frontend.py only calls these for uploads that
+# arrive without its 'preprocessed' flag. The settings are shared with the page:
+#   images - EXIF-rotated, greyscale, longest side at most IMAGE_MAX_SIDE, JPEG;
+#            plenty for reading a shopping list
+#   audio  - mono, AUDIO_SAMPLE_RATE Hz, leading/trailing silence trimmed, low-bitrate
+#            MP3 here (Opus at AUDIO_BITRATE in the browser); speech needs nothing more
+# Both return (data, mime_type). Anything that can't be processed (pydub or ffmpeg
+# missing, undecodable file) is returned unchanged with mime_type None.
+#   python bench_media.py   compares sizes and upload times on the data/ samples
+
+try:
+    from pydub import AudioSegment
+    from pydub.exceptions import CouldntDecodeError, CouldntEncodeError
+    from pydub.silence import detect_leading_silence
+except ImportError:
+    AudioSegment = None
+
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "70"))
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "32k")
+EXTENSIONS = {"image/jpeg": ".jpg", "audio/mp3": ".mp3"}
+# Silence is anything this many dB below the clip's average loudness
+SILENCE_MARGIN_DB = 12
+# Kept on either side of the speech so words aren't clipped
+SILENCE_PADDING_MS = 200
+
+
+def preprocess_image(data, max_side=IMAGE_MAX_SIDE, quality=IMAGE_QUALITY):
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image).convert("L")
+    except (OSError, ValueError):
+        return data, None
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality, optimize=True)
+    if out.tell() >= len(data):
+        # Already small and compressed harder than this
+        return data, None
+    return out.getvalue(), "image/jpeg"
+
+
+def trim_silence(segment):
+    threshold = segment.dBFS - SILENCE_MARGIN_DB
+    start = detect_leading_silence(segment, threshold)
+    end = len(segment) - detect_leading_silence(segment.reverse(), threshold)
+    if end <= start:
+        return segment
+    return segment[max(0, start - SILENCE_PADDING_MS):min(len(segment), end + SILENCE_PADDING_MS)]
+
+
+def preprocess_audio(data, sample_rate=AUDIO_SAMPLE_RATE, bitrate=AUDIO_BITRATE):
+    if AudioSegment is None:
+        return data, None
+    try:
+        # No format: ffmpeg sniffs it (phone "mp3"s are often AAC in an MP4 container)
+        segment = AudioSegment.from_file(io.BytesIO(data))
+        segment = trim_silence(segment.set_channels(1).set_frame_rate(sample_rate))
+        out = io.BytesIO()
+        segment.export(out, format="mp3", bitrate=bitrate)
+    except (CouldntDecodeError, CouldntEncodeError, OSError):
+        # OSError: no ffmpeg on this machine
+        return data, None
+    return out.getvalue(), "audio/mp3"
@@ -0,0 +1,140 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Two-level cache in front of product retrieval + the Gemini summary:
+#   1. LRUCache      - exact match on the normalized phrase ("Milk " == "milk")
+#   2. SemanticCache - reuses a previous result whose query embedding is within a
+#                      cosine threshold of the new one ("milk" ~ "some milk")
+# Both evict by TTL and size and keep hit/miss counters for /cache-stats/.
+
+
+def normalize_query(text):
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return " ".join(text.split())
+
+
+class LRUCache:
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl:
+                del self._items[key]
+                self.evictions += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SemanticCache:
+    # Embeddings live in one preallocated matrix so a lookup is a single
+    # matrix-vector product; they must be L2-normalized like the rest of the system.
+    # max_size <= 0 disables the cache: get always misses and put keeps nothing.
+
+    def __init__(self, dim, threshold=0.95, max_size=2000, ttl=3600):
+        self.threshold = threshold
+        max_size = max(0, max_size)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._embeddings = np.zeros((max_size, dim), dtype=np.float32)
+        self._values = [None] * max_size
+        self._created = np.full(max_size, -np.inf)
+        self._last_used = np.full(max_size, -np.inf)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _live(self, now):
+        return now - self._created <= self.ttl
+
+    def get(self, embedding):
+        with self._lock:
+            now = time.monotonic()
+            live = self._live(now)
+            if live.any():
+                scores = self._embeddings @ np.asarray(embedding, dtype=np.float32)
+                scores[~live] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._last_used[best] = now
+                    self.hits += 1
+                    return self._values[best]
+            self.misses += 1
+            return None
+
+    def put(self, embedding, value):
+        if not self.max_size:
+            return
+        with self._lock:
+            now = time.monotonic()
+            live = self._live(now)
+            if live.all():
+                # Full: replace the least recently used entry
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            else:
+                slot = int(np.argmin(live))
+                if self._values[slot] is not None:
+                    self.evictions += 1
+            self._embeddings[slot] = embedding
+            self._values[slot] = value
+            self._created[slot] = now
+            self._last_used[slot] = now
+
+    def clear(self):
+        with self._lock:
+            self._values = [None] * self.max_size
+            self._created[:] = -np.inf
+            self._last_used[:] = -np.inf
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": int(self._live(time.monotonic()).sum()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "threshold": self.threshold,
+            }
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from fake_llm import FakeGenerativeModel
+from intents import extract_intent, extract_intent_from_media
+from llm_client import AsyncLLMClient
+
+# Replays recorded Gemini replies to intent prompts through extract_intent, served by
+# a local stub model in order, and checks the parsed result and the number of
+# re-asks. One JSON object per line:
+#   {"input": "...", "replies": ["<reply 1>", "<reply to the re-ask>", ...],
+#    "intent": "add the products" | null, "products": [...], "reasks": 1}
+# Single-pass image / audio replies add "kind": "image" | "audio" and the expected
+# "transcript" (the input is then unused).
+# Add replies here whenever the model's output drifts in a new way.
+#   python replay_intents.py --data ../data/intent_replies.jsonl
+# Exits non-zero if any recording no longer gives its expected result.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay recorded intent replies through the strict parser")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), "..", "data", "intent_replies.jsonl"))
+    parser.add_argument("--max-reasks", type=int, default=2)
+    return parser.parse_args()
+
+
+async def replay(record, max_reasks):
+    replies = iter(record["replies"])
+    model = FakeGenerativeModel(latency=0, jitter=0, respond=lambda prompt: next(replies))
+    stats = {}
+    if "kind" in record:
+        transcript, intent, products = await extract_intent_from_media(AsyncLLMClient(model), None, record["kind"],
+                                                                       max_reasks, stats)
+        if transcript != record["transcript"]:
+            products = {"transcript": transcript, "products": products}
+    else:
+        intent, products = await extract_intent(AsyncLLMClient(model), record["input"], max_reasks, stats)
+    return intent, products, stats.get("reasks", 0), model.calls
+
+
+def main():
+    args = parse_args()
+    with open(args.data) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    failed = 0
+    for record in records:
+        intent, products, reasks, calls = asyncio.run(replay(record, args.max_reasks))
+        got = (intent.value if intent else None, products, reasks)
+        expected = (record["intent"], record["products"], record["reasks"])
+        if got != expected:
+            failed += 1
+            print(f"FAIL {record['input']!r}: got {got}, expected {expected}")
+        else:
+            print(f"ok   {record['input']!r}: {got[0]} {got[1]} after {calls} call(s)")
+
+    print(f"{len(records) - failed}/{len(records)} recordings replayed as expected")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
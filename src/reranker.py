@@ -0,0 +1,86 @@
+import math
+import threading
+from collections import Counter
+
+import attributes
+from lexical_index import tokenize
+
+# Second retrieval stage: the first stage (dense or hybrid search) returns the top-k
+# candidates, and a cheap scorer puts them in a better order. Every feature is in
+# [-1, 1] and the final score is a weighted sum:
+#   retrieval  - first-stage score, scaled so the best candidate is 1
+#   overlap    - share of the query's tokens found in the product name (and, with
+#                less weight, in its text)
+#   colour     - +1 if the product has a colour the query asks for, -1 if it only
+#                has other colours, 0 if the query names no colour
+#   size       - the same for sizes ("1kg" == "1000 g")
+#   popularity - how often the product has been added to carts, on a log scale
+# Scoring k candidates takes microseconds, far cheaper than asking the LLM to pick.
+
+WEIGHTS = {"retrieval": 1.0, "overlap": 0.6, "colour": 0.4, "size": 0.4, "popularity": 0.1}
+
+
+class Popularity:
+    # Cart adds per product, counted in process; resets on restart
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, product_ids):
+        with self._lock:
+            self._counts.update(product_ids)
+
+    def scores(self, product_ids):
+        with self._lock:
+            top = max(self._counts.values(), default=0)
+            counts = [self._counts.get(product_id, 0) for product_id in product_ids]
+        if not top:
+            return [0.0] * len(counts)
+        return [math.log1p(count) / math.log1p(top) for count in counts]
+
+
+def _overlap(query_tokens, tokens):
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & set(tokens)) / len(query_tokens)
+
+
+def _match(wanted, found):
+    if not wanted:
+        return 0.0
+    if wanted & found:
+        return 1.0
+    return -1.0 if found else 0.0
+
+
+def features(phrase, products, retrieval_scores, popularity=None):
+    query_tokens = set(tokenize(phrase))
+    query_colours = attributes.colours(phrase)
+    query_sizes = attributes.sizes(phrase)
+
+    top = max((abs(s) for s in retrieval_scores), default=0) or 1.0
+    popular = popularity.scores([p["Uniq Id"] for p in products]) if popularity else [0.0] * len(products)
+
+    rows = []
+    for product, score, pop in zip(products, retrieval_scores, popular):
+        name = product["Product Name"] or ""
+        text = product["Combined Text"] or ""
+        rows.append({
+            "retrieval": score / top,
+            "overlap": 0.7 * _overlap(query_tokens, tokenize(name)) + 0.3 * _overlap(query_tokens, tokenize(text)),
+            "colour": _match(query_colours, attributes.colours(name) or attributes.colours(text)),
+            "size": _match(query_sizes, attributes.sizes(name) or attributes.sizes(text)),
+            "popularity": pop,
+        })
+    return rows
+
+
+def rerank(phrase, products, retrieval_scores, popularity=None, weights=WEIGHTS):
+    # Returns copies of products, best first, with "Score" and the per-feature "Scores"
+    ranked = []
+    for product, feats in zip(products, features(phrase, products, retrieval_scores, popularity)):
+        score = sum(weights[name] * value for name, value in feats.items())
+        ranked.append(dict(product, **{"Score": round(score, 4), "Scores": {k: round(v, 4) for k, v in feats.items()}}))
+    ranked.sort(key=lambda p: p["Score"], reverse=True)
+    return ranked
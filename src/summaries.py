@@ -0,0 +1,51 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+
+# Deferred product summaries. The /process-* endpoints can return as soon as retrieval
+# and the cart update are done and hand out a summary id per product instead:
+#   lazy       - nothing runs until the summary is fetched
+#   background - generation starts immediately
+# Either way the result is fetched later with GET /summaries/{summary_id}.
+# Jobs are coroutines run as tasks on the app's event loop, so they go through the
+# same AsyncLLMClient (timeout, retries, concurrency limit) as every other model call,
+# and a poll that waits holds no thread.
+
+
+class SummaryJobs:
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._jobs = OrderedDict()
+
+    def create(self, fn, start=False):
+        # fn returns the coroutine that generates the summary; call from the event loop
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = job = {"fn": fn, "task": None}
+        while len(self._jobs) > self.max_size:
+            self._jobs.popitem(last=False)
+        if start:
+            job["task"] = asyncio.ensure_future(fn())
+        return job_id
+
+    async def get(self, job_id, wait=30.0):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        # A lazy job is started by whoever asks for it first
+        if job["task"] is None:
+            job["task"] = asyncio.ensure_future(job["fn"]())
+        task = job["task"]
+
+        try:
+            # shield: a poll that gives up doesn't cancel the summary for the next one
+            summary = await asyncio.wait_for(asyncio.shield(task), wait)
+        except asyncio.TimeoutError:
+            return {"summary_id": job_id, "status": "running"}
+        except Exception as e:
+            return {"summary_id": job_id, "status": "error", "error": str(e)}
+        return {"summary_id": job_id, "status": "done", "summary": summary}
+
+    def shutdown(self):
+        for job in self._jobs.values():
+            if job["task"] is not None:
+                job["task"].cancel()